@@ -1,10 +1,19 @@
 from zipfile import Path
+import os
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 from sklearn.preprocessing import StandardScaler
 from sklearn.cluster import KMeans
+from export_hub import figures
+from export_hub.drift import HISTORY_COLUMNS, HISTORY_PATH, load_history
+from export_hub.forecasting import MODELS_PATH, ForecastTable
+from export_hub.hierarchy import LEVELS, HierarchyTree, ROOT_LABEL
+from export_hub.jobs import DONE, FAILED, JobQueue, generate_batch_reports, rebuild_data_files
+from export_hub.moments import METRICS
+from export_hub.projection import PCA_COLUMNS
+from export_hub.query import BACKEND_ENV, PARQUET_PATH, CachedBackend, DuckDBBackend, Filters, PandasBackend
+from export_hub.reports import REPORTS_DIR
+from export_hub.snapshot import Snapshot, open_snapshot, source_mtimes
 
 # --- PAGE CONFIGURATION ---
 st.set_page_config(
@@ -124,54 +133,168 @@ div[data-testid="stSlider"] div[data-baseweb="slider"] > div:nth-child(3) {
 
 
 # --- DATA LOADING ---
-@st.cache_data
-def load_all_data():
-    # Load main dataset
-    try:
-        from pathlib import Path
-        DATA_PATH = Path(__file__).parent / "data" / "Cleaned_Principal_Commodity_Exports_with_clusters.xlsx"
-        df = pd.read_excel(DATA_PATH, engine='openpyxl')
+# Tables, indexes and per-cell summaries are memory-mapped from an on-disk snapshot,
+# so a restarted replica serves without re-reading the source files
+SNAPSHOT_HASH = {Snapshot: lambda snapshot: snapshot.key}
 
-        df['Cluster'] = 'Cluster ' + df['Cluster'].astype(str)
-    except FileNotFoundError:
-        st.error("Main data file not found. Please check the file path in the `load_all_data` function.")
-        df = pd.DataFrame()
+@st.cache_resource(max_entries=1)
+def load_snapshot(modified):
+    # Keyed on the data files' modification times; a changed file maps (or builds) a new snapshot
+    return open_snapshot()
 
+@st.cache_data(hash_funcs=SNAPSHOT_HASH, max_entries=1)
+def load_all_data(snapshot):
     # Load all analytical files
     try:
-        risk_df = pd.read_csv("C:\\Users\\athar\\OneDrive\\Desktop\\College\\DS_ML_Analysis\\data\\market_risk_and_diversification.csv")
-        gems_df = pd.read_csv("C:\\Users\\athar\\OneDrive\\Desktop\\College\\DS_ML_Analysis\\data\\hidden_gems.csv")
-        sankey_df = pd.read_csv("C:\\Users\\athar\\OneDrive\\Desktop\\College\\DS_ML_Analysis\\data\\sankey_data.csv")
+        risk_df, gems_df, sankey_df = (snapshot.table(name) for name in ("market_risk", "hidden_gems", "sankey"))
     except FileNotFoundError as e:
-        st.error(f"An analytical file is missing: {e}. Please ensure all generated CSV files are present in the same directory as your app.py file.")
+        st.error(f"An analytical file is missing: {e}. Run `python -m export_hub.pipeline` to regenerate the `data/` folder.")
         risk_df, gems_df, sankey_df = pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
 
-    return df, risk_df, gems_df, sankey_df
+    return risk_df, gems_df, sankey_df
+
+@st.cache_resource(hash_funcs=SNAPSHOT_HASH, max_entries=1)
+def load_query_backend(snapshot):
+    # EXPORT_HUB_BACKEND=duckdb queries the Parquet store instead of loading the table into memory
+    # Aggregates are cached per filter state and shared by every session (and warmed at startup)
+    if os.environ.get(BACKEND_ENV, "pandas").lower() == "duckdb":
+        if PARQUET_PATH.exists():
+            try:
+                return CachedBackend(DuckDBBackend(PARQUET_PATH))
+            except ImportError:
+                st.error("The DuckDB backend needs the `duckdb` package. Falling back to pandas.")
+        else:
+            st.error("Parquet store not found. Run `python -m export_hub.query --export`. Falling back to pandas.")
+    try:
+        return CachedBackend(PandasBackend(snapshot.table('main'), snapshot.indexes('main')))
+    except FileNotFoundError:
+        st.error("Main data file not found. Run `python -m export_hub.pipeline` to build the `data/` folder.")
+        return None
+
+@st.cache_resource(hash_funcs=SNAPSHOT_HASH, max_entries=1)
+def load_moments(snapshot):
+    # Per-cell summaries written by the pipeline (built from rows when the snapshot was made if the file is missing)
+    try:
+        return snapshot.moments()
+    except FileNotFoundError:
+        return None
 
-df, risk_df, gems_df, sankey_df = load_all_data()
+@st.cache_data
+def load_drift_history(modified):
+    # Keyed on the file's modification time, so a newly scored period shows up on the next run
+    try:
+        return load_history()
+    except FileNotFoundError:
+        return pd.DataFrame(columns=HISTORY_COLUMNS)
+
+@st.cache_resource(max_entries=1)
+def load_forecast_models(modified):
+    # Fitted by `python -m export_hub.forecasting` or the pipeline; keyed on the file's modification time
+    try:
+        return ForecastTable.load()
+    except FileNotFoundError:
+        return None
+
+@st.cache_data
+def build_hierarchy(leaf_sums):
+    # Built once per filter state from leaf-level sums; the treemap then only reads windows of it
+    return HierarchyTree(leaf_sums)
+
+# --- BACKGROUND JOBS ---
+@st.cache_resource
+def get_job_queue():
+    # One bounded pool shared by every session, so heavy work never runs in a script thread
+    return JobQueue(max_workers=1)
+
+@st.cache_resource
+def get_swapped_jobs():
+    # Ids of finished rebuilds whose files have already replaced the cached data
+    return set()
+
+JOB_TASKS = {
+    "Rebuild data files": (rebuild_data_files, {}),
+    # A couple of report workers, so the server keeps its CPUs for the dashboard
+    "Regenerate batch reports": (generate_batch_reports, {"out_dir": str(REPORTS_DIR), "jobs": 2}),
+}
+
+job_queue = get_job_queue()
+swapped_jobs = get_swapped_jobs()
+for job in job_queue.jobs():
+    if job.status == DONE and job.name == "Rebuild data files" and job.id not in swapped_jobs:
+        # New files are on disk; drop the cached loaders so this run reads them
+        swapped_jobs.add(job.id)
+        for loader in (load_snapshot, load_all_data, build_hierarchy, load_query_backend, load_moments,
+                       load_forecast_models):
+            loader.clear()
+
+def submit_job(task):
+    func, kwargs = JOB_TASKS[task]
+    job_queue.submit(func, name=task, **kwargs)
+
+def show_jobs(job_queue, limit=5):
+    for job in reversed(job_queue.jobs()[-limit:]):
+        label = f"**{job.name}** · {job.status}"
+        if job.active:
+            st.progress(job.progress, text=f"{label} · {job.message or 'waiting for a worker'}")
+            st.button("Cancel", key=f"cancel_{job.id}", on_click=job_queue.cancel, args=(job.id,))
+        elif job.status == DONE:
+            st.success(f"{label} in {job.elapsed:.1f}s")
+        elif job.status == FAILED:
+            st.error(f"{label}: {job.error}")
+        else:
+            st.caption(label)
+
+@st.fragment(run_every=2)
+def poll_jobs(job_queue):
+    # Polls while jobs are active; once they finish, a full rerun swaps in their results
+    show_jobs(job_queue)
+    if not job_queue.jobs(active_only=True):
+        st.rerun()
+
+snapshot = load_snapshot(source_mtimes())
+backend = load_query_backend(snapshot)
+risk_df, gems_df, sankey_df = load_all_data(snapshot)
+moments = load_moments(snapshot)
+drift_history = load_drift_history(HISTORY_PATH.stat().st_mtime if HISTORY_PATH.exists() else None)
+forecast_models = load_forecast_models(MODELS_PATH.stat().st_mtime if MODELS_PATH.exists() else None)
 
 # --- SIDEBAR (GLOBAL FILTERS) ---
 with st.sidebar:
     st.title("Filters")
     st.markdown("Apply global filters to the entire dataset.")
 
-    if not df.empty:
+    if backend is not None:
+        cluster_options = backend.distinct("Cluster")
         selected_clusters = st.multiselect(
             "Filter by Cluster",
-            options=sorted(df["Cluster"].unique()),
-            default=sorted(df["Cluster"].unique())
+            options=cluster_options,
+            default=cluster_options
         )
-        min_val, max_val = float(df['VALUE_USD_MILLION'].min()), float(df['VALUE_USD_MILLION'].max())
+        min_val, max_val = backend.bounds('VALUE_USD_MILLION')
         value_range = st.slider(
             "Filter by Value (USD Million)",
             min_value=min_val,
             max_value=max_val,
             value=(min_val, max_val)
         )
+        exclude_outliers = st.checkbox(
+            "Exclude price outliers",
+            value=False,
+            help="Hide rows whose price per kg is an outlier for their commodity (robust median/MAD and IQR rules), and rows whose price rounds to zero."
+        )
     else:
         st.warning("Main data not loaded. Filters are unavailable.")
         selected_clusters = []
         value_range = (0,0)
+        exclude_outliers = False
+
+    with st.expander("⚙️ Background Jobs"):
+        task = st.selectbox("Task", list(JOB_TASKS), key="job_task")
+        st.button("Run in background", use_container_width=True, on_click=submit_job, args=(task,))
+        if job_queue.jobs(active_only=True):
+            poll_jobs(job_queue)
+        else:
+            show_jobs(job_queue)
 
     with st.expander("ℹ️ About this Dashboard"):
         st.info(
@@ -183,14 +306,10 @@ with st.sidebar:
             """
         )
 
-# Apply global filters first
-if not df.empty:
-    filtered_df = df[
-        df["Cluster"].isin(selected_clusters) &
-        df["VALUE_USD_MILLION"].between(value_range[0], value_range[1])
-    ]
-else:
-    filtered_df = pd.DataFrame()
+# Global filters are passed to the query backend, which applies them to every query
+# A slider left at its full range is no predicate at all, so stored summaries can answer the query
+full_range = backend is not None and tuple(value_range) == (min_val, max_val)
+filters = Filters(tuple(selected_clusters), None if full_range else tuple(value_range), exclude_outliers)
 
 
 # --- MAIN PAGE ---
@@ -214,60 +333,35 @@ st.markdown("Navigate through different analysis modes to uncover insights from
 st.markdown("### 🚀 Select Your Analysis Mode")
 analysis_mode = st.selectbox(
     "Choose how you want to explore the data:",
-    [
-        "📈 Dashboard Overview",
-        "🌊 Export Flow Analysis",
-        "🔬 Commodity Deep-Dive",
-        "🌐 Geographic Comparison",
-        "🧩 Cluster Explorer",
-        "🎯 What-If Scenario Planner",
-        "🌎 Market Risk & Diversification"
-    ],
+    figures.ANALYSIS_MODES,
     label_visibility="collapsed"
 )
 
-# --- RENDER THE SELECTED PAGE ---
+# --- PAGE RENDERERS ---
+# Panels with their own widgets are fragments: changing one of their widgets reruns
+# only that panel. Each renderer receives the data it depends on as arguments, which
+# Streamlit keeps for fragment reruns, so the CSS, sidebar and raw data expander are
+# not rebuilt. Data comes from the query backend (`export_hub.query`), restricted to
+# the columns and rows each view needs; figures and tables come from
+# `export_hub.figures`, which the batch report generator shares.
+
+def show_metrics(metrics, columns):
+    for col, (label, value) in zip(st.columns(columns), metrics.items()):
+        col.metric(label, value)
 
-if analysis_mode == "📈 Dashboard Overview":
-    st.markdown("#### Key Metrics Overview")
 
-    row1_cols = st.columns(2)
-    row1_cols[0].metric("Total Export Value", f"${filtered_df['VALUE_USD_MILLION'].sum():,.2f} M")
-    row1_cols[1].metric("Total Quantity", f"${filtered_df['QUANTITY_KGS'].sum():,.0f} Kgs")
+def render_dashboard_overview(backend, filters):
+    st.markdown("#### Key Metrics Overview")
 
-    row2_cols = st.columns(2)
-    row2_cols[0].metric("Unique Commodities", f"{filtered_df['COMMODITY_NAME'].nunique()}")
-    row2_cols[1].metric("Destination Countries", f"{filtered_df['COUNTRY'].nunique()}")
+    metrics = list(figures.overview_metrics(backend.summary(filters)).items())
+    show_metrics(dict(metrics[:2]), 2)
+    show_metrics(dict(metrics[2:]), 2)
 
     st.markdown("---")
 
     st.markdown("#### Global Export Distribution by Value (USD Million)")
-    country_df = filtered_df.groupby('COUNTRY')['VALUE_USD_MILLION'].sum().reset_index()
-
-    if not country_df.empty and country_df['VALUE_USD_MILLION'].nunique() > 5:
-        labels = ["Lowest", "Low", "Medium", "High", "Highest"]
-        country_df['Value Tier'] = pd.qcut(country_df['VALUE_USD_MILLION'], q=5, labels=labels, duplicates='drop')
-
-        color_map = {
-            "Lowest": "#d1e5f0", "Low": "#92c5de", "Medium": "#4393c3",
-            "High": "#2166ac", "Highest": "#053061"
-        }
-
-        fig_map = px.choropleth(
-            country_df,
-            locations="COUNTRY",
-            locationmode="country names",
-            color="Value Tier",
-            hover_name="COUNTRY",
-            hover_data={"Value Tier": False, "VALUE_USD_MILLION": ':.2f'},
-            color_discrete_map=color_map,
-            category_orders={"Value Tier": labels}
-        )
-        fig_map.update_layout(
-            geo=dict(bgcolor='rgba(0,0,0,0)'),
-            margin={"r":0,"t":0,"l":0,"b":0},
-            legend_title_text='Export Value Tier'
-        )
+    fig_map = figures.country_tier_map(backend.group_sum(filters, 'COUNTRY'))
+    if fig_map is not None:
         st.plotly_chart(fig_map, use_container_width=True)
     else:
         st.warning("Not enough data diversity to display a tiered world map. Please broaden your filters.")
@@ -277,137 +371,184 @@ if analysis_mode == "📈 Dashboard Overview":
     col1, col2 = st.columns([2, 1])
     with col1:
         st.markdown("#### Top 15 Commodities by Export Value")
-        top_commodities = filtered_df.groupby("COMMODITY_NAME")["VALUE_USD_MILLION"].sum().nlargest(15)
-        fig = px.bar(top_commodities, x=top_commodities.values, y=top_commodities.index, orientation='h',
-                     labels={'y': 'Commodity', 'x': 'Total Value (USD Million)'}, color=top_commodities.values, color_continuous_scale="Blues")
-        fig.update_layout(yaxis={'categoryorder':'total ascending'})
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(figures.top_commodities_bar(backend.top_n(filters, 'COMMODITY_NAME', 15)), use_container_width=True)
 
     with col2:
         st.markdown("#### Share of Value by Cluster")
-        cluster_val = filtered_df.groupby("Cluster")["VALUE_USD_MILLION"].sum()
-        fig_pie = px.pie(cluster_val, values=cluster_val.values, names=cluster_val.index, hole=0.5,
-                         title="Total Value Distribution", color_discrete_sequence=px.colors.sequential.RdBu)
-        st.plotly_chart(fig_pie, use_container_width=True)
+        st.plotly_chart(figures.cluster_share_pie(backend.group_sum(filters, 'Cluster')), use_container_width=True)
 
-elif analysis_mode == "🌊 Export Flow Analysis":
+
+def render_export_flow(sankey_df):
     st.markdown("#### 🌊 Export Value Flow (Sankey Diagram)")
     st.info("This diagram illustrates the flow of export revenue from a strategic **Cluster**, through its top **Commodities**, to its top **Destination Countries**.")
 
     if not sankey_df.empty:
-        all_nodes = pd.unique(sankey_df[['source', 'target']].values.ravel('K'))
-        node_dict = {node: i for i, node in enumerate(all_nodes)}
-
-        sankey_df['source_id'] = sankey_df['source'].map(node_dict)
-        sankey_df['target_id'] = sankey_df['target'].map(node_dict)
-
-        fig = go.Figure(data=[go.Sankey(
-            node=dict(pad=15, thickness=20, line=dict(color="black", width=0.5), label=all_nodes),
-            link=dict(source=sankey_df['source_id'], target=sankey_df['target_id'], value=sankey_df['value'])
-        )])
-
-        fig.update_layout(title_text="Top Export Value Flows", font_size=12, height=600)
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(figures.sankey_figure(sankey_df), use_container_width=True)
     else:
         st.warning("Sankey diagram data not available.")
 
-elif analysis_mode == "🔬 Commodity Deep-Dive":
+
+@st.fragment
+def render_commodity_deep_dive(backend, filters, moments):
     st.markdown("#### Select a Commodity to Analyze in Detail")
     commodity_to_analyze = st.selectbox(
         "Search for a commodity",
-        options=sorted(filtered_df["COMMODITY_NAME"].unique())
+        options=backend.distinct("COMMODITY_NAME", filters)
     )
 
     st.markdown("---")
 
     if commodity_to_analyze:
-        commodity_df = filtered_df[filtered_df["COMMODITY_NAME"] == commodity_to_analyze]
+        commodity_df = backend.frame(filters.where(COMMODITY_NAME=commodity_to_analyze))
         st.header(f"Analysis for: {commodity_to_analyze}")
 
-        c_kpi_1, c_kpi_2, c_kpi_3 = st.columns(3)
-        c_kpi_1.metric("Total Value", f"${commodity_df['VALUE_USD_MILLION'].sum():,.2f} M")
-        c_kpi_2.metric("Avg. Price/Kg", f"${commodity_df['PRICE_PER_KG'].mean():.2f}")
-        c_kpi_3.metric("Top Destination", commodity_df.loc[commodity_df['VALUE_USD_MILLION'].idxmax()]['COUNTRY'])
+        profile = None
+        if moments is not None and moments.covers(filters):
+            profile = moments.select(filters, COMMODITY_NAME=commodity_to_analyze).profile(())
+        show_metrics(figures.commodity_metrics(commodity_df, profile), 3)
 
         col1, col2 = st.columns(2)
         with col1:
             st.markdown("##### Top 10 Destinations by Value")
-            top_countries = commodity_df.groupby("COUNTRY")["VALUE_USD_MILLION"].sum().nlargest(10)
-            fig_country = px.bar(top_countries, x=top_countries.values, y=top_countries.index, orientation='h',
-                                 color=top_countries.values, color_continuous_scale="Aggrnyl")
-            fig_country.update_layout(yaxis={'categoryorder':'total ascending'}, title="Top Markets",
-                                      xaxis_title="Value (USD M)", yaxis_title="Country")
-            st.plotly_chart(fig_country, use_container_width=True)
+            st.plotly_chart(figures.top_destinations_bar(commodity_df), use_container_width=True)
         with col2:
             st.markdown("##### Price Distribution")
-            fig_price_dist = px.histogram(commodity_df, x="PRICE_PER_KG", nbins=30,
-                                          title="Distribution of Price per Kg")
-            st.plotly_chart(fig_price_dist, use_container_width=True)
+            st.plotly_chart(figures.price_histogram(commodity_df), use_container_width=True)
 
-elif analysis_mode == "🌐 Geographic Comparison":
+
+@st.fragment
+def render_geographic_comparison(backend, filters):
     st.markdown("#### Compare Export Performance Between Two Countries")
 
+    country_options = backend.distinct("COUNTRY", filters)
     col1, col2 = st.columns(2)
     with col1:
-        country1 = st.selectbox("Select Country 1", options=sorted(filtered_df["COUNTRY"].unique()), index=0)
+        country1 = st.selectbox("Select Country 1", options=country_options, index=0)
     with col2:
-        country2 = st.selectbox("Select Country 2", options=sorted(filtered_df["COUNTRY"].unique()), index=1)
+        country2 = st.selectbox("Select Country 2", options=country_options, index=min(1, max(len(country_options) - 1, 0)))
 
     st.markdown("---")
 
-    if country1 and country2:
-        df1 = filtered_df[filtered_df["COUNTRY"] == country1]
-        df2 = filtered_df[filtered_df["COUNTRY"] == country2]
-
-        total1 = df1['VALUE_USD_MILLION'].sum()
-        total2 = df2['VALUE_USD_MILLION'].sum()
+    if country1 and country1 == country2:
+        st.info("Select two different countries to compare.")
+    elif country1 and country2:
+        pair_df = pd.concat([backend.frame(filters.where(COUNTRY=country)) for country in {country1, country2}])
+        metrics, fig = figures.country_comparison(pair_df, country1, country2)
 
         st.header(f"Comparison: {country1} vs. {country2}")
-        comp_col1, comp_col2, comp_col3 = st.columns(3)
-        comp_col1.metric(f"Total Value ({country1})", f"${total1:,.2f} M")
-        comp_col2.metric(f"Total Value ({country2})", f"${total2:,.2f} M")
-        comp_col3.metric("Value Difference", f"${total1 - total2:,.2f} M")
+        show_metrics(metrics, 3)
 
         st.markdown(f"##### Top Shared Commodities Exported to {country1} and {country2}")
 
-        merged_df = pd.merge(df1, df2, on="COMMODITY_NAME", suffixes=(f'_{country1}', f'_{country2}'))
-        merged_df['TOTAL_VALUE'] = merged_df[f'VALUE_USD_MILLION_{country1}'] + merged_df[f'VALUE_USD_MILLION_{country2}']
-
-        if not merged_df.empty:
-            top_shared = merged_df.nlargest(10, 'TOTAL_VALUE')
-            fig = px.bar(top_shared, y='COMMODITY_NAME',
-                         x=[f'VALUE_USD_MILLION_{country1}', f'VALUE_USD_MILLION_{country2}'],
-                         title=f"Top 10 Shared Commodities by Value", barmode='group',
-                         labels={'value': 'Export Value (USD M)', 'variable': 'Country'})
+        if fig is not None:
             st.plotly_chart(fig, use_container_width=True)
         else:
             st.warning(f"No common commodities found between {country1} and {country2} with current filters.")
 
-elif analysis_mode == "🧩 Cluster Explorer":
+
+@st.fragment
+def render_cluster_explorer(backend, filters):
     st.markdown("#### Explore the Clusters")
     st.markdown("Clusters group commodities with similar value, quantity, and price profiles.")
 
-    fig_scatter = px.scatter(
-        filtered_df,
-        x="QUANTITY_KGS",
-        y="VALUE_USD_MILLION",
-        color="Cluster",
-        size="PRICE_PER_KG",
-        hover_name="COMMODITY_NAME",
-        hover_data=["COUNTRY"],
-        log_x=True,
-        log_y=True,
-        title="Interactive Cluster Map (Log Scale)",
-        color_discrete_sequence=px.colors.qualitative.Vivid
-    )
-    fig_scatter.update_layout(height=600)
-    st.plotly_chart(fig_scatter, use_container_width=True)
+    view = st.radio("Projection", figures.CLUSTER_VIEWS, horizontal=True)
 
-elif analysis_mode == "🎯 What-If Scenario Planner":
+    if view == "Log-Log Scatter":
+        columns = ["QUANTITY_KGS", "VALUE_USD_MILLION", "PRICE_PER_KG"]
+    elif set(PCA_COLUMNS).issubset(backend.columns):
+        columns = PCA_COLUMNS
+    else:
+        st.warning("PCA coordinates are missing. Run `python -m export_hub.pipeline` to compute them.")
+        return
+    points = backend.frame(filters, ["Cluster", "COMMODITY_NAME", "COUNTRY"] + columns)
+    st.plotly_chart(figures.cluster_scatter(points, view), use_container_width=True)
+
+
+PROFILE_GROUPS = {"Cluster": "Cluster", "Commodity": "COMMODITY_NAME", "Country": "COUNTRY"}
+
+@st.fragment
+def render_cluster_profile(moments, filters):
+    st.markdown("#### Cluster Profiles")
+    st.markdown("Count, mean, spread and range of value, quantity and price, assembled from stored per-cell summaries without reading row data.")
+
+    if moments is None:
+        st.warning("Cell summaries not available. Run `python -m export_hub.pipeline` to build them.")
+        return
+    if not moments.covers(filters):
+        st.info("The value-range filter applies to individual rows, so these profiles cover the full value range. Cluster and outlier filters still apply.")
+
+    cells = moments.select(filters)
+    if not len(cells):
+        st.warning("No data matches the current filters.")
+        return
+
+    show_metrics(figures.profile_metrics(cells.profile(())), 4)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        group_by = st.radio("Group by", list(PROFILE_GROUPS), horizontal=True)
+    with col2:
+        metric = st.selectbox("Chart metric", METRICS, index=METRICS.index('PRICE_PER_KG'))
+
+    profile = cells.profile(PROFILE_GROUPS[group_by])
+    st.plotly_chart(figures.profile_bar(profile, metric), use_container_width=True)
+    st.dataframe(figures.profile_table(profile), use_container_width=True)
+
+
+def set_treemap_path(path):
+    st.session_state["treemap_path"] = path
+
+def drill_into(path):
+    # Runs before the rerun, so the treemap renders the new focus straight away
+    choice = st.session_state.get("treemap_drill")
+    if choice:
+        set_treemap_path(path + (choice,))
+    st.session_state["treemap_drill"] = None
+
+@st.fragment
+def render_treemap(backend, filters):
+    st.markdown("#### Cluster → Commodity → Country Treemap")
+    st.info("Each box shows the two levels below the current focus. Pick a node to drill into it; smaller items are grouped into **Other**.")
+
+    leaf_sums = backend.group_sum(filters, list(LEVELS)).reset_index()
+    if not leaf_sums.empty:
+        tree = build_hierarchy(leaf_sums)
+        path = tuple(st.session_state.get("treemap_path", ()))
+        if path and tree.value(path) == 0:
+            path = ()  # The focused node was filtered out
+
+        ctrl1, ctrl2 = st.columns([3, 1])
+        with ctrl2:
+            chart_type = st.radio("Chart Type", ["Treemap", "Sunburst"], horizontal=True)
+            top_n = st.slider("Items per node", 5, 25, 10)
+
+        nodes = tree.view(path, depth=2, top_n=top_n)
+
+        with ctrl1:
+            st.markdown("**Focus:** " + " › ".join((ROOT_LABEL,) + path))
+            drill_options = [] if tree.is_leaf(path) else [
+                label for label, _ in tree.children(path, top_n) if label != "Other"
+            ]
+            nav_col1, nav_col2 = st.columns([3, 1])
+            nav_col1.selectbox(
+                f"Drill into a {tree.levels[len(path)].replace('_NAME', '').title()}" if drill_options else "Drill into",
+                options=drill_options, index=None, placeholder="Choose a node to expand",
+                disabled=not drill_options, key="treemap_drill", on_change=drill_into, args=(path,),
+            )
+            nav_col2.button("⬆️ Up one level", disabled=not path, use_container_width=True,
+                            on_click=set_treemap_path, args=(path[:-1],))
+
+        st.plotly_chart(figures.treemap_figure(nodes, chart_type), use_container_width=True)
+    else:
+        st.warning("No data matches the current filters.")
+
+
+@st.fragment
+def render_what_if_planner(backend, filters, forecast_models):
     st.markdown("#### Scenario & Forecasting Tool")
     st.markdown("Select a commodity and adjust the sliders to forecast the potential impact on total export value.")
 
-    commodity_options = sorted(filtered_df['COMMODITY_NAME'].unique())
+    commodity_options = backend.distinct('COMMODITY_NAME', filters)
     selected_commodity = st.selectbox("Select a Commodity to Analyze", commodity_options)
 
     if selected_commodity:
@@ -418,34 +559,41 @@ elif analysis_mode == "🎯 What-If Scenario Planner":
         with col2:
             quantity_increase = st.slider("Quantity Increase (%)", 0, 100, 10)
 
-        scenario_df = filtered_df[filtered_df['COMMODITY_NAME'] == selected_commodity].copy()
-        current_total_value = scenario_df['VALUE_USD_MILLION'].sum()
-        scenario_df['hypothetical_PRICE_PER_KG'] = scenario_df['PRICE_PER_KG'] * (1 + price_increase / 100)
-        scenario_df['hypothetical_QUANTITY_KGS'] = scenario_df['QUANTITY_KGS'] * (1 + quantity_increase / 100)
-        scenario_df['hypothetical_VALUE_USD_MILLION'] = (scenario_df['hypothetical_PRICE_PER_KG'] * scenario_df['hypothetical_QUANTITY_KGS']) / 1_000_000
-        new_total_value = scenario_df['hypothetical_VALUE_USD_MILLION'].sum()
-        uplift = new_total_value - current_total_value
-        if current_total_value > 0:
-            growth_percent = (uplift / current_total_value) * 100
-        else:
-            growth_percent = float('inf')
+        commodity_df = backend.frame(filters.where(COMMODITY_NAME=selected_commodity))
+        results = figures.scenario_results(commodity_df, selected_commodity, price_increase, quantity_increase)
+        current_total_value = results['current']
 
         st.markdown("---")
         st.markdown(f"#### Scenario Results for: **{selected_commodity}**")
 
+        metrics = figures.scenario_metrics(results)
         res_col1, res_col2, res_col3 = st.columns(3)
-        res_col1.metric("Current Revenue", f"${current_total_value:,.2f} M")
-        res_col2.metric("Hypothetical Revenue", f"${new_total_value:,.2f} M", f"${uplift:,.2f} M")
-        res_col3.metric("Projected Growth", f"{growth_percent:.2f}%")
+        res_col1.metric("Current Revenue", metrics["Current Revenue"])
+        res_col2.metric("Hypothetical Revenue", metrics["Hypothetical Revenue"], f"${results['uplift']:,.2f} M")
+        res_col3.metric("Projected Growth", metrics["Projected Growth"])
 
-        fig = go.Figure(data=[
-            go.Bar(name='Current Revenue', x=['Revenue'], y=[current_total_value], marker_color='rgba(255, 255, 255, 0.3)'),
-            go.Bar(name='Hypothetical Revenue', x=['Revenue'], y=[new_total_value], marker_color='rgba(255, 255, 255, 0.7)')
-        ])
-        fig.update_layout(barmode='group', title_text='Revenue Comparison', yaxis_title="Value (USD Million)", template='plotly_dark', paper_bgcolor='#0d1b2a', plot_bgcolor='#0d1b2a', font_color='white')
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(figures.revenue_comparison_bar(current_total_value, results['new']), use_container_width=True)
 
-elif analysis_mode == "🌎 Market Risk & Diversification":
+        st.markdown("---")
+        if forecast_models is not None:
+            next_year = forecast_models.last_year + 1
+            st.markdown(f"##### 📈 Trend Projection for FY {next_year}-{str(next_year + 1)[-2:]}")
+            st.markdown("Projected from a linear trend fitted to each destination market's yearly export value.")
+
+            projection = figures.trend_projection(forecast_models, selected_commodity, results['countries'])
+            projected_total = projection['PROJECTED_VALUE_USD_MILLION'].sum()
+
+            proj_col1, proj_col2 = st.columns(2)
+            proj_col1.metric("Trend-Projected Revenue", f"${projected_total:,.2f} M", f"${projected_total - current_total_value:,.2f} M")
+            proj_col2.metric("Markets Projected", f"{len(projection)}")
+
+            st.plotly_chart(figures.projected_markets_bar(projection), use_container_width=True)
+        else:
+            st.info("Trend projections are unavailable. Run `python -m export_hub.forecasting` to fit the models.")
+
+
+@st.fragment
+def render_market_risk(risk_df):
     st.markdown("#### Market Concentration and Diversification Analysis")
     st.markdown("Identify commodities that are either well-diversified or at high risk due to dependence on a single market.")
     
@@ -456,8 +604,7 @@ elif analysis_mode == "🌎 Market Risk & Diversification":
         st.markdown("These commodities are exported to the highest number of unique countries, indicating a healthy and resilient market reach.")
         
         if not risk_df.empty:
-            most_diversified = risk_df.sort_values(by="DIVERSIFICATION_SCORE", ascending=False).head(15)
-            st.dataframe(most_diversified[['COMMODITY_NAME', 'DIVERSIFICATION_SCORE', 'TOTAL_COMMODITY_VALUE']], use_container_width=True)
+            st.dataframe(figures.most_diversified(risk_df), use_container_width=True)
         else:
             st.warning("Risk & Diversification data not available.")
 
@@ -466,14 +613,12 @@ elif analysis_mode == "🌎 Market Risk & Diversification":
         st.markdown("These commodities are heavily reliant on a single country for a large percentage of their total export value.")
 
         if not risk_df.empty:
-            highest_risk = risk_df.sort_values(by="CONCENTRATION_RISK_%", ascending=False).head(15)
-            
             def style_risk(val):
                 color = 'red' if val > 75 else ('orange' if val > 50 else 'green')
                 return f'color: {color}; font-weight: bold;'
             
             st.dataframe(
-                highest_risk[['COMMODITY_NAME', 'TOP_MARKET', 'CONCENTRATION_RISK_%']].style.applymap(
+                figures.highest_risk(risk_df).style.applymap(
                     style_risk, subset=['CONCENTRATION_RISK_%']
                 ).format({'CONCENTRATION_RISK_%': '{:.2f}%'}),
                 use_container_width=True
@@ -482,9 +627,76 @@ elif analysis_mode == "🌎 Market Risk & Diversification":
             st.warning("Risk & Diversification data not available.")
 
 
+@st.fragment
+def render_drift_alerts(drift_history):
+    st.markdown("#### Cluster Drift & Anomaly Alerts")
+    st.markdown("Each newly ingested period is scored against the stored cluster centroids and per-commodity baselines. This view only reads the stored results.")
+
+    if drift_history.empty:
+        st.info("No periods have been scored yet. Run `python -m export_hub.drift NEW_FILE --period 2023-24` when new data lands.")
+        return
+
+    periods = list(dict.fromkeys(drift_history['PERIOD']))
+    period = st.selectbox("Period", periods, index=len(periods) - 1)
+    period_rows = drift_history[drift_history['PERIOD'] == period]
+
+    show_metrics(figures.drift_metrics(period_rows), 4)
+
+    st.markdown("##### 🚨 Alerts")
+    alerts = figures.drift_alerts_table(period_rows)
+    if alerts.empty:
+        st.success("No thresholds crossed in this period.")
+    else:
+        st.dataframe(alerts, use_container_width=True, hide_index=True)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.plotly_chart(figures.cluster_share_change(period_rows), use_container_width=True)
+    with col2:
+        st.markdown("##### Cluster Migrations (pairs)")
+        matrix = figures.migration_matrix(period_rows)
+        if matrix.empty:
+            st.caption("No (commodity, country) pair changed cluster.")
+        else:
+            st.dataframe(matrix, use_container_width=True)
+
+    if len(periods) > 1:
+        st.plotly_chart(figures.drift_alert_history(drift_history), use_container_width=True)
+
+
+# --- RENDER THE SELECTED PAGE ---
+if backend is None and analysis_mode not in ("🌊 Export Flow Analysis", "📋 Cluster Profile", "🌎 Market Risk & Diversification", "🚨 Drift Alerts"):
+    st.warning("Main data not loaded. This analysis mode is unavailable.")
+elif analysis_mode == "📈 Dashboard Overview":
+    render_dashboard_overview(backend, filters)
+elif analysis_mode == "🌊 Export Flow Analysis":
+    render_export_flow(sankey_df)
+elif analysis_mode == "🔬 Commodity Deep-Dive":
+    render_commodity_deep_dive(backend, filters, moments)
+elif analysis_mode == "🌐 Geographic Comparison":
+    render_geographic_comparison(backend, filters)
+elif analysis_mode == "🧩 Cluster Explorer":
+    render_cluster_explorer(backend, filters)
+elif analysis_mode == "📋 Cluster Profile":
+    render_cluster_profile(moments, filters)
+elif analysis_mode == "🌳 Treemap Drill-Down":
+    render_treemap(backend, filters)
+elif analysis_mode == "🎯 What-If Scenario Planner":
+    render_what_if_planner(backend, filters, forecast_models)
+elif analysis_mode == "🌎 Market Risk & Diversification":
+    render_market_risk(risk_df)
+elif analysis_mode == "🚨 Drift Alerts":
+    render_drift_alerts(drift_history)
+
+
 # --- DATA TABLE AT THE BOTTOM ---
+# Capped so a large store never has to be materialized in full
+RAW_DATA_ROWS = 50_000
+filtered_df = backend.frame(filters, limit=RAW_DATA_ROWS) if backend is not None else pd.DataFrame()
 if not filtered_df.empty:
     with st.expander("📂 View Filtered Raw Data"):
+        if len(filtered_df) == RAW_DATA_ROWS:
+            st.caption(f"Showing the first {RAW_DATA_ROWS:,} matching rows.")
         st.dataframe(filtered_df, use_container_width=True)
 
         @st.cache_data
@@ -0,0 +1 @@
+"""Supporting modules for India's Export Intelligence Hub (`app.py`)."""
@@ -0,0 +1,78 @@
+"""Price anomaly and outlier detection.
+
+Flags per-commodity PRICE_PER_KG outliers in one vectorized pass using
+robust group statistics (median/MAD and IQR), and quarantines rows whose
+price is not finite (zero quantities produce `inf`). Zero prices (values
+rounded to 0.00) cannot be scored on a log scale and get their own flag, so
+the outlier filter can hide them along with the outliers.
+"""
+import numpy as np
+import pandas as pd
+
+# --- FLAG VALUES ---
+FLAG_COLUMN = "PRICE_FLAG"
+FLAG_OK = "ok"
+FLAG_OUTLIER = "outlier"
+FLAG_NON_FINITE = "non_finite"
+FLAG_ZERO_PRICE = "zero_price"
+FLAG_CATEGORIES = [FLAG_OK, FLAG_OUTLIER, FLAG_NON_FINITE, FLAG_ZERO_PRICE]
+# Flags hidden by the "Exclude price outliers" filter
+OUTLIER_FLAGS = (FLAG_OUTLIER, FLAG_ZERO_PRICE)
+
+# Scales MAD so it estimates the standard deviation of a normal distribution.
+MAD_SCALE = 1.4826
+
+
+def flag_price_anomalies(
+    df,
+    price_col="PRICE_PER_KG",
+    group_col="COMMODITY_NAME",
+    mad_threshold=3.5,
+    iqr_k=3.0,
+    log_scale=True,
+):
+    """Return a copy of `df` with a categorical PRICE_FLAG column added.
+
+    Statistics are computed per `group_col` with groupby-transform, so every
+    row is scored in a single pass. Prices are compared on a log10 scale by
+    default because per-kg prices span several orders of magnitude. A row is
+    an outlier when its robust z-score exceeds `mad_threshold` or it falls
+    outside the Tukey fences `Q1 - iqr_k*IQR` / `Q3 + iqr_k*IQR`.
+    Non-finite prices are flagged as `non_finite` and excluded from the
+    statistics. When `log_scale` is set, zero prices are excluded too and
+    flagged as `zero_price`.
+    """
+    out = df.copy()
+    price = out[price_col].astype(float)
+    finite = np.isfinite(price)
+    # Zero prices (values rounded to 0.00) have no log and are left unscored.
+    scorable = finite & (price > 0) if log_scale else finite
+
+    # Unscorable rows become NaN so the group statistics skip them.
+    x = price.where(scorable)
+    if log_scale:
+        x = np.log10(x)
+
+    groups = x.groupby(out[group_col], sort=False)
+    median = groups.transform("median")
+    q1 = groups.transform("quantile", 0.25)
+    q3 = groups.transform("quantile", 0.75)
+    mad = (x - median).abs().groupby(out[group_col], sort=False).transform("median")
+
+    robust_z = (x - median) / (MAD_SCALE * mad.where(mad > 0))
+    iqr = q3 - q1
+    outside_fences = (x < q1 - iqr_k * iqr) | (x > q3 + iqr_k * iqr)
+    is_outlier = (robust_z.abs() > mad_threshold) | (outside_fences & (iqr > 0))
+
+    flags = np.select([~finite, ~scorable, is_outlier], [FLAG_NON_FINITE, FLAG_ZERO_PRICE, FLAG_OUTLIER], FLAG_OK)
+    out[FLAG_COLUMN] = pd.Categorical(flags, categories=FLAG_CATEGORIES)
+    return out
+
+
+def quarantine_non_finite(df, cols):
+    """Split `df` into (clean, quarantined) on non-finite values in `cols`."""
+    if isinstance(cols, str):
+        cols = [cols]
+    values = df[cols].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+    finite = np.isfinite(values).all(axis=1)
+    return df[finite].copy(), df[~finite].copy()
@@ -0,0 +1,52 @@
+"""Data locations and the cleaning step shared by the app and offline tools."""
+from pathlib import Path
+
+import pandas as pd
+
+# --- PATHS ---
+ROOT_DIR = Path(__file__).resolve().parent.parent
+DATA_DIR = ROOT_DIR / "data"
+
+# Raw DGCI&S principal commodity exports, keyed by fiscal year start (2022 = FY 2022-23)
+YEARLY_SOURCES = {
+    2021: ROOT_DIR / "DS_ML_Analysis" / "Principal_Commodity_wise_export_for_the_year_202122.csv",
+    2022: ROOT_DIR / "22070521071_CA1_EDA (Raw).xlsx",
+}
+
+RAW_COLUMNS = {
+    'PRINCIPLE COMMODITY': 'COMMODITY_NAME',
+    'COUNTRY': 'COUNTRY',
+    'UNIT': 'UNIT',
+    'QUANTITY': 'QUANTITY_KGS',
+    'Value(US$ million)': 'VALUE_USD_MILLION',
+}
+
+
+def read_raw(path):
+    """Read a raw export file (CSV or Excel) as published."""
+    path = Path(path)
+    if path.suffix.lower() == ".csv":
+        return pd.read_csv(path)
+    return pd.read_excel(path, engine="openpyxl")
+
+
+def clean_exports(raw):
+    """Apply the notebook's cleaning steps to a raw export frame."""
+    df = raw.rename(columns=RAW_COLUMNS)
+    df = df.dropna()
+    df['QUANTITY_KGS'] = pd.to_numeric(df['QUANTITY_KGS'], errors='coerce')
+    df['VALUE_USD_MILLION'] = pd.to_numeric(df['VALUE_USD_MILLION'], errors='coerce')
+    df = df.dropna(subset=['QUANTITY_KGS', 'VALUE_USD_MILLION'])
+    df['PRICE_PER_KG'] = (df['VALUE_USD_MILLION'] * 1_000_000) / df['QUANTITY_KGS']
+    return df.reset_index(drop=True)
+
+
+def load_yearly_exports(sources=None):
+    """Load and clean every yearly source into one frame with a YEAR column."""
+    sources = YEARLY_SOURCES if sources is None else sources
+    frames = []
+    for year, path in sorted(sources.items()):
+        df = clean_exports(read_raw(path))
+        df['YEAR'] = year
+        frames.append(df)
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,234 @@
+"""Cluster-drift and anomaly monitor for newly ingested periods.
+
+`DriftBaseline` stores what a new month or year is compared against. That
+is the clustering scaler and centroids, the cluster of every (commodity,
+country) pair, each commodity's destination mix and median price, and the
+value share of each cluster. Like the forecast models, it is a handful of
+NumPy arrays.
+
+`score_partition` compares a new partition with the baseline in one
+vectorized pass and returns long-format history rows:
+
+    rows               rows scored, commodities/pairs not in the baseline
+    migration          pairs whose nearest centroid changed (subject "from → to")
+    far_from_centroid  rows further from their centroid than the baseline's 99th percentile
+    cluster_share      value share per cluster vs. the baseline
+    mix_shift          per-commodity total variation distance between destination mixes
+    price_jump         per-commodity log10 change of the median price per kg
+
+Rows that cross a threshold have ALERT set. The dashboard's alerts view
+only reads the small history table, so it never reprocesses past periods.
+
+    python -m export_hub.drift NEW_FILE --period 2023-24
+"""
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from export_hub.data import DATA_DIR, clean_exports, read_raw
+
+BASELINE_PATH = DATA_DIR / "drift_baseline.npz"
+HISTORY_PATH = DATA_DIR / "drift_history.csv"
+HISTORY_COLUMNS = ['PERIOD', 'KIND', 'SUBJECT', 'VALUE', 'BASELINE', 'ALERT']
+FEATURES = ['VALUE_USD_MILLION', 'QUANTITY_KGS', 'PRICE_PER_KG']
+
+# --- ALERT THRESHOLDS ---
+SHARE_CHANGE = 0.05  # Absolute change in a cluster's share of total value
+MIX_SHIFT = 0.25  # Total variation distance between destination mixes
+PRICE_JUMP = np.log10(2)  # Median price doubled or halved
+MIGRATION_RATE = 0.10  # Share of matched pairs that changed cluster
+MIN_ROWS = 3  # Commodities with fewer rows than this are not scored for mix or price
+
+
+def _normalize(names):
+    return pd.Series(names, dtype=str).str.strip().str.upper().to_numpy()
+
+
+def _log_price(price):
+    # Zero prices have no log; they are left out of the medians
+    price = np.asarray(price, dtype=float)
+    return np.log10(np.where(price > 0, price, np.nan))
+
+
+class DriftBaseline:
+    """Reference statistics for drift scoring, stored as parallel NumPy arrays."""
+
+    def __init__(self, features, scaler_mean, scaler_scale, centroids, cluster_names, distance_p99,
+                 cluster_share, pair_commodity, pair_country, pair_cluster, pair_value,
+                 commodities, median_log_price):
+        self.features = [str(f) for f in features]
+        self.scaler_mean = np.asarray(scaler_mean, dtype=float)
+        self.scaler_scale = np.asarray(scaler_scale, dtype=float)
+        self.centroids = np.asarray(centroids, dtype=float)
+        self.cluster_names = np.asarray(cluster_names).astype(str)
+        self.distance_p99 = np.asarray(distance_p99, dtype=float)
+        self.cluster_share = np.asarray(cluster_share, dtype=float)
+        self.pair_commodity = np.asarray(pair_commodity).astype(str)
+        self.pair_country = np.asarray(pair_country).astype(str)
+        self.pair_cluster = np.asarray(pair_cluster, dtype=np.int64)
+        self.pair_value = np.asarray(pair_value, dtype=float)
+        self.commodities = np.asarray(commodities).astype(str)
+        self.median_log_price = np.asarray(median_log_price, dtype=float)
+
+    @classmethod
+    def from_clustered(cls, frame, features=FEATURES, cluster_col='Cluster'):
+        """Baseline from the clustered app table (integer cluster ids, QUANTITY_KGS > 0).
+
+        The scaler is refitted on the same rows the clustering used, and each
+        centroid is its cluster's mean in scaled space (which is what KMeans
+        converges to), so no fitted model is needed.
+        """
+        frame = frame[frame['QUANTITY_KGS'] > 0]
+        X = frame[list(features)].to_numpy(dtype=float)
+        mean, scale = X.mean(axis=0), X.std(axis=0)
+        scale[scale == 0] = 1.0
+        scaled = (X - mean) / scale
+
+        ids = frame[cluster_col].to_numpy()
+        cluster_ids = np.unique(ids)
+        code = np.searchsorted(cluster_ids, ids)
+        k = len(cluster_ids)
+        centroids = np.vstack([scaled[code == c].mean(axis=0) for c in range(k)])
+        distance = np.linalg.norm(scaled - centroids[code], axis=1)
+        distance_p99 = np.array([np.quantile(distance[code == c], 0.99) for c in range(k)])
+        value = frame['VALUE_USD_MILLION'].to_numpy(dtype=float)
+        cluster_share = np.bincount(code, value, minlength=k) / value.sum()
+
+        pairs = pd.DataFrame({
+            'commodity': _normalize(frame['COMMODITY_NAME']), 'country': _normalize(frame['COUNTRY']),
+            'cluster': code, 'value': value, 'log_price': _log_price(frame['PRICE_PER_KG']),
+        })
+        # One row per pair; a pair split over several rows keeps its highest-value cluster
+        pairs = pairs.sort_values('value', ascending=False, kind='stable')
+        agg = pairs.groupby(['commodity', 'country'], sort=True).agg(
+            cluster=('cluster', 'first'), value=('value', 'sum'))
+        prices = pairs.groupby('commodity', sort=True)['log_price'].median()
+        return cls(
+            features, mean, scale, centroids, [f"Cluster {c}" for c in cluster_ids], distance_p99,
+            cluster_share, agg.index.get_level_values(0), agg.index.get_level_values(1),
+            agg['cluster'], agg['value'], prices.index, prices.to_numpy(),
+        )
+
+    def assign(self, X):
+        """Nearest centroid and distance to it for raw (unscaled) feature rows."""
+        scaled = (X - self.scaler_mean) / self.scaler_scale
+        d2 = ((scaled[:, None, :] - self.centroids[None, :, :]) ** 2).sum(axis=2)
+        nearest = d2.argmin(axis=1)
+        return nearest, np.sqrt(d2[np.arange(len(X)), nearest])
+
+    def save(self, path=BASELINE_PATH):
+        np.savez_compressed(path, **{name: np.asarray(value) for name, value in vars(self).items()})
+
+    @classmethod
+    def load(cls, path=BASELINE_PATH):
+        with np.load(path) as npz:
+            return cls(**{name: npz[name] for name in npz.files})
+
+
+def score_partition(baseline, partition, period):
+    """Drift and anomaly metrics for one new partition, as history rows."""
+    part = partition[np.isfinite(partition[baseline.features]).all(axis=1) & (partition['QUANTITY_KGS'] > 0)]
+    commodity, country = _normalize(part['COMMODITY_NAME']), _normalize(part['COUNTRY'])
+    known = np.isin(commodity, baseline.commodities)
+    part, commodity, country = part[known], commodity[known], country[known]
+    X = part[baseline.features].to_numpy(dtype=float)
+    value = part['VALUE_USD_MILLION'].to_numpy(dtype=float)
+    nearest, distance = baseline.assign(X)
+    k = len(baseline.centroids)
+
+    rows = []
+
+    def add(kind, subject, val, base=np.nan, alert=False):
+        rows.append((period, kind, subject, float(val), float(base), bool(alert)))
+
+    add('rows', 'scored', len(part))
+    add('rows', 'new_commodities', len(set(_normalize(partition['COMMODITY_NAME'])) - set(baseline.commodities)))
+
+    # Cluster migration for pairs present in both periods
+    base_index = pd.MultiIndex.from_arrays([baseline.pair_commodity, baseline.pair_country], names=['commodity', 'country'])
+    match = base_index.get_indexer(pd.MultiIndex.from_arrays([commodity, country]))
+    matched = match >= 0
+    add('rows', 'new_pairs', (~matched).sum())
+    moves = np.bincount(baseline.pair_cluster[match[matched]] * k + nearest[matched], minlength=k * k).reshape(k, k)
+    migrated = moves.sum() - np.trace(moves)
+    add('migration', 'total', migrated, matched.sum(), migrated > MIGRATION_RATE * max(matched.sum(), 1))
+    for src, dst in zip(*np.nonzero(moves)):
+        if src != dst:
+            add('migration', f"{baseline.cluster_names[src]} → {baseline.cluster_names[dst]}", moves[src, dst])
+
+    far = distance > baseline.distance_p99[nearest]
+    add('far_from_centroid', 'total', far.sum(), 0.01 * len(part), far.sum() > 0.05 * max(len(part), 1))
+
+    share = np.bincount(nearest, value, minlength=k) / max(value.sum(), np.finfo(float).tiny)
+    for c in range(k):
+        add('cluster_share', baseline.cluster_names[c], share[c], baseline.cluster_share[c],
+            abs(share[c] - baseline.cluster_share[c]) > SHARE_CHANGE)
+
+    # Destination mix: both periods' (commodity, country) values side by side
+    new_pairs = pd.DataFrame({'commodity': commodity, 'country': country, 'new': value})
+    new_pairs = new_pairs.groupby(['commodity', 'country']).sum()
+    base_pairs = pd.Series(baseline.pair_value, index=base_index, name='base')
+    both = new_pairs.join(base_pairs, how='outer').fillna(0.0)
+    both = both[both.index.get_level_values(0).isin(np.unique(commodity))]
+    totals = both.groupby(level=0).transform('sum')
+    tvd = (0.5 * (both['new'] / totals['new'] - both['base'] / totals['base']).abs()).groupby(level=0).sum()
+
+    log_price = pd.Series(_log_price(part['PRICE_PER_KG']), index=commodity)
+    price = log_price.groupby(level=0).agg(['median', 'count'])
+    price = price[price['count'] >= MIN_ROWS]
+    base_price = pd.Series(baseline.median_log_price, index=baseline.commodities)
+    jump = price['median'] - base_price.reindex(price.index)
+
+    for name in price.index:
+        add('mix_shift', name, tvd.get(name, np.nan), np.nan, tvd.get(name, 0.0) > MIX_SHIFT)
+        add('price_jump', name, jump[name], base_price[name], abs(jump[name]) > PRICE_JUMP)
+
+    return pd.DataFrame(rows, columns=HISTORY_COLUMNS)
+
+
+def load_history(path=HISTORY_PATH):
+    return pd.read_csv(path, dtype={'PERIOD': str})
+
+
+def record(rows, path=HISTORY_PATH):
+    """Append a period's rows to the history table, replacing an earlier run for the same period."""
+    try:
+        history = load_history(path)
+        history = history[~history['PERIOD'].isin(rows['PERIOD'].astype(str).unique())]
+    except FileNotFoundError:
+        history = pd.DataFrame(columns=HISTORY_COLUMNS)
+    history = pd.concat([history, rows], ignore_index=True) if len(history) else rows
+    history.to_csv(path, index=False)
+    return history
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a newly ingested period for cluster drift and anomalies.")
+    parser.add_argument("source", nargs="?", help="Raw export file for the new period (CSV or Excel).")
+    parser.add_argument("--period", help="Label stored with the results, e.g. 2023-24 or 2024-03.")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH), help="Baseline file (.npz).")
+    parser.add_argument("--history", default=str(HISTORY_PATH), help="History table (.csv) to append to.")
+    parser.add_argument("--build-baseline", metavar="CLUSTERED_XLSX",
+                        help="Rebuild the baseline from a clustered app table instead of scoring.")
+    args = parser.parse_args()
+
+    if args.build_baseline:
+        DriftBaseline.from_clustered(pd.read_excel(args.build_baseline, engine='openpyxl')).save(args.baseline)
+        print(f"Saved baseline to {args.baseline}")
+        return
+    if not args.source or not args.period:
+        parser.error("a source file and --period are required to score a period")
+
+    rows = score_partition(DriftBaseline.load(args.baseline), clean_exports(read_raw(Path(args.source))), args.period)
+    record(rows, args.history)
+    alerts = rows[rows['ALERT']]
+    print(f"Scored {int(rows.loc[rows['SUBJECT'] == 'scored', 'VALUE'].iloc[0]):,} rows for {args.period}: "
+          f"{len(alerts)} alerts -> {args.history}")
+    for _, alert in alerts.iterrows():
+        print(f"  [{alert['KIND']}] {alert['SUBJECT']}: {alert['VALUE']:.3f} (baseline {alert['BASELINE']:.3f})")
+
+
+if __name__ == "__main__":
+    main()
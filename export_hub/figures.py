@@ -0,0 +1,342 @@
+"""Figures, tables and KPI values for every analysis mode.
+
+These builders are plain functions of the data with no Streamlit calls, so
+the dashboard and the headless report generator (`export_hub.reports`)
+produce identical output.
+"""
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+ANALYSIS_MODES = [
+    "📈 Dashboard Overview",
+    "🌊 Export Flow Analysis",
+    "🔬 Commodity Deep-Dive",
+    "🌐 Geographic Comparison",
+    "🧩 Cluster Explorer",
+    "📋 Cluster Profile",
+    "🌳 Treemap Drill-Down",
+    "🎯 What-If Scenario Planner",
+    "🌎 Market Risk & Diversification",
+    "🚨 Drift Alerts",
+]
+
+CLUSTER_VIEWS = ["Log-Log Scatter", "PCA 2D", "PCA 3D"]
+
+
+# --- DASHBOARD OVERVIEW ---
+# These take aggregates from a query backend (`export_hub.query`) rather than rows.
+def overview_metrics(summary):
+    return {
+        "Total Export Value": f"${summary['value']:,.2f} M",
+        "Total Quantity": f"${summary['quantity']:,.0f} Kgs",
+        "Unique Commodities": f"{summary['commodities']}",
+        "Destination Countries": f"{summary['countries']}",
+    }
+
+
+def country_tier_map(country_totals):
+    """Choropleth of per-country export value in quintile tiers, or None if values are too uniform."""
+    country_df = country_totals.rename('VALUE_USD_MILLION').rename_axis('COUNTRY').reset_index()
+    if country_df.empty or country_df['VALUE_USD_MILLION'].nunique() <= 5:
+        return None
+
+    labels = ["Lowest", "Low", "Medium", "High", "Highest"]
+    country_df['Value Tier'] = pd.qcut(country_df['VALUE_USD_MILLION'], q=5, labels=labels, duplicates='drop')
+
+    color_map = {
+        "Lowest": "#d1e5f0", "Low": "#92c5de", "Medium": "#4393c3",
+        "High": "#2166ac", "Highest": "#053061"
+    }
+
+    fig_map = px.choropleth(
+        country_df,
+        locations="COUNTRY",
+        locationmode="country names",
+        color="Value Tier",
+        hover_name="COUNTRY",
+        hover_data={"Value Tier": False, "VALUE_USD_MILLION": ':.2f'},
+        color_discrete_map=color_map,
+        category_orders={"Value Tier": labels}
+    )
+    fig_map.update_layout(
+        geo=dict(bgcolor='rgba(0,0,0,0)'),
+        margin={"r":0,"t":0,"l":0,"b":0},
+        legend_title_text='Export Value Tier'
+    )
+    return fig_map
+
+
+def top_commodities_bar(top_commodities):
+    fig = px.bar(top_commodities, x=top_commodities.values, y=top_commodities.index, orientation='h',
+                 labels={'y': 'Commodity', 'x': 'Total Value (USD Million)'}, color=top_commodities.values, color_continuous_scale="Blues")
+    fig.update_layout(yaxis={'categoryorder':'total ascending'})
+    return fig
+
+
+def cluster_share_pie(cluster_val):
+    return px.pie(cluster_val, values=cluster_val.values, names=cluster_val.index, hole=0.5,
+                  title="Total Value Distribution", color_discrete_sequence=px.colors.sequential.RdBu)
+
+
+# --- EXPORT FLOW ---
+def sankey_figure(sankey_df):
+    all_nodes = pd.unique(sankey_df[['source', 'target']].values.ravel('K'))
+    node_dict = {node: i for i, node in enumerate(all_nodes)}
+
+    fig = go.Figure(data=[go.Sankey(
+        node=dict(pad=15, thickness=20, line=dict(color="black", width=0.5), label=all_nodes),
+        link=dict(source=sankey_df['source'].map(node_dict), target=sankey_df['target'].map(node_dict), value=sankey_df['value'])
+    )])
+
+    fig.update_layout(title_text="Top Export Value Flows", font_size=12, height=600)
+    return fig
+
+
+# --- COMMODITY DEEP-DIVE ---
+def commodity_metrics(commodity_df, profile=None):
+    """KPI values for one commodity; totals come from a one-row moment profile when given."""
+    if profile is not None:
+        total_value = profile[('VALUE_USD_MILLION', 'total')].iloc[0]
+        mean_price = profile[('PRICE_PER_KG', 'mean')].iloc[0]
+    else:
+        total_value = commodity_df['VALUE_USD_MILLION'].sum()
+        mean_price = commodity_df['PRICE_PER_KG'].mean()
+    return {
+        "Total Value": f"${total_value:,.2f} M",
+        "Avg. Price/Kg": f"${mean_price:.2f}",
+        "Top Destination": commodity_df.loc[commodity_df['VALUE_USD_MILLION'].idxmax()]['COUNTRY'],
+    }
+
+
+def top_destinations_bar(commodity_df, n=10):
+    top_countries = commodity_df.groupby("COUNTRY")["VALUE_USD_MILLION"].sum().nlargest(n)
+    fig_country = px.bar(top_countries, x=top_countries.values, y=top_countries.index, orientation='h',
+                         color=top_countries.values, color_continuous_scale="Aggrnyl")
+    fig_country.update_layout(yaxis={'categoryorder':'total ascending'}, title="Top Markets",
+                              xaxis_title="Value (USD M)", yaxis_title="Country")
+    return fig_country
+
+
+def price_histogram(commodity_df):
+    return px.histogram(commodity_df, x="PRICE_PER_KG", nbins=30, title="Distribution of Price per Kg")
+
+
+# --- GEOGRAPHIC COMPARISON ---
+def country_comparison(frame, country1, country2):
+    """KPI values and the shared-commodity bar chart (None if nothing is shared).
+
+    `frame` needs the rows of both countries; other rows are ignored.
+    """
+    df1 = frame[frame["COUNTRY"] == country1]
+    df2 = frame[frame["COUNTRY"] == country2]
+
+    total1 = df1['VALUE_USD_MILLION'].sum()
+    total2 = df2['VALUE_USD_MILLION'].sum()
+    metrics = {
+        f"Total Value ({country1})": f"${total1:,.2f} M",
+        f"Total Value ({country2})": f"${total2:,.2f} M",
+        "Value Difference": f"${total1 - total2:,.2f} M",
+    }
+
+    merged_df = pd.merge(df1, df2, on="COMMODITY_NAME", suffixes=(f'_{country1}', f'_{country2}'))
+    merged_df['TOTAL_VALUE'] = merged_df[f'VALUE_USD_MILLION_{country1}'] + merged_df[f'VALUE_USD_MILLION_{country2}']
+    if merged_df.empty:
+        return metrics, None
+
+    top_shared = merged_df.nlargest(10, 'TOTAL_VALUE')
+    fig = px.bar(top_shared, y='COMMODITY_NAME',
+                 x=[f'VALUE_USD_MILLION_{country1}', f'VALUE_USD_MILLION_{country2}'],
+                 title=f"Top 10 Shared Commodities by Value", barmode='group',
+                 labels={'value': 'Export Value (USD M)', 'variable': 'Country'})
+    return metrics, fig
+
+
+# --- CLUSTER EXPLORER ---
+def cluster_scatter(frame, view="Log-Log Scatter"):
+    if view == "Log-Log Scatter":
+        fig_scatter = px.scatter(
+            frame,
+            x="QUANTITY_KGS",
+            y="VALUE_USD_MILLION",
+            color="Cluster",
+            size="PRICE_PER_KG",
+            hover_name="COMMODITY_NAME",
+            hover_data=["COUNTRY"],
+            log_x=True,
+            log_y=True,
+            title="Interactive Cluster Map (Log Scale)",
+            color_discrete_sequence=px.colors.qualitative.Vivid
+        )
+    elif view == "PCA 2D":
+        # Coordinates were fitted at ingest; this only plots them
+        fig_scatter = px.scatter(
+            frame, x="PCA1", y="PCA2", color="Cluster",
+            hover_name="COMMODITY_NAME", hover_data=["COUNTRY"],
+            title="2D PCA Projection of Scaled Value, Quantity and Price",
+            color_discrete_sequence=px.colors.qualitative.Vivid
+        )
+    else:
+        fig_scatter = px.scatter_3d(
+            frame, x="PCA1", y="PCA2", z="PCA3", color="Cluster",
+            hover_name="COMMODITY_NAME", hover_data=["COUNTRY"],
+            title="3D PCA Projection of Scaled Value, Quantity and Price",
+            color_discrete_sequence=px.colors.qualitative.Vivid
+        )
+        fig_scatter.update_traces(marker=dict(size=3))
+    fig_scatter.update_layout(height=600)
+    return fig_scatter
+
+
+# --- CLUSTER PROFILE ---
+# These take profiles from `MomentTable.profile` (one row per group, (metric, stat) columns).
+def profile_metrics(overall):
+    row = overall.iloc[0]
+    return {
+        "Records": f"{int(row[('VALUE_USD_MILLION', 'count')]):,}",
+        "Total Export Value": f"${row[('VALUE_USD_MILLION', 'total')]:,.2f} M",
+        "Mean Price/Kg": f"${row[('PRICE_PER_KG', 'mean')]:,.2f}",
+        "Price/Kg Std. Dev.": f"${row[('PRICE_PER_KG', 'std')]:,.2f}",
+    }
+
+
+def profile_table(profile):
+    table = profile.copy()
+    table.columns = [f"{metric} {stat}" for metric, stat in table.columns]
+    return table.round(2)
+
+
+def profile_bar(profile, metric, n=20):
+    """Mean of `metric` per group with ±1 std error bars, for the `n` groups with most records."""
+    top = profile[metric].nlargest(n, 'count').sort_values('mean')
+    fig = go.Figure(go.Bar(
+        x=top['mean'], y=top.index.astype(str), orientation='h',
+        error_x=dict(type='data', array=top['std'].fillna(0)),
+        customdata=top[['count', 'min', 'max']],
+        hovertemplate='<b>%{y}</b><br>Mean: %{x:,.2f}<br>Records: %{customdata[0]}'
+                      '<br>Min: %{customdata[1]:,.2f}<br>Max: %{customdata[2]:,.2f}<extra></extra>',
+    ))
+    fig.update_layout(title=f"Mean {metric} (±1 std)", xaxis_title=metric, height=max(350, 28 * len(top)))
+    return fig
+
+
+# --- TREEMAP ---
+def treemap_figure(nodes, chart_type="Treemap"):
+    trace = go.Treemap if chart_type == "Treemap" else go.Sunburst
+    fig_tree = go.Figure(trace(
+        ids=nodes['id'], labels=nodes['label'], parents=nodes['parent'], values=nodes['value'],
+        branchvalues='total', hovertemplate='<b>%{label}</b><br>Value: $%{value:,.2f} M<extra></extra>',
+    ))
+    fig_tree.update_layout(margin={"r":0,"t":10,"l":0,"b":0}, height=600)
+    return fig_tree
+
+
+# --- WHAT-IF SCENARIO PLANNER ---
+def scenario_results(frame, commodity, price_increase, quantity_increase):
+    """Current vs. hypothetical revenue for a commodity under price/quantity bumps (in %)."""
+    scenario_df = frame[frame['COMMODITY_NAME'] == commodity].copy()
+    current_total_value = scenario_df['VALUE_USD_MILLION'].sum()
+    scenario_df['hypothetical_PRICE_PER_KG'] = scenario_df['PRICE_PER_KG'] * (1 + price_increase / 100)
+    scenario_df['hypothetical_QUANTITY_KGS'] = scenario_df['QUANTITY_KGS'] * (1 + quantity_increase / 100)
+    scenario_df['hypothetical_VALUE_USD_MILLION'] = (scenario_df['hypothetical_PRICE_PER_KG'] * scenario_df['hypothetical_QUANTITY_KGS']) / 1_000_000
+    new_total_value = scenario_df['hypothetical_VALUE_USD_MILLION'].sum()
+    uplift = new_total_value - current_total_value
+    if current_total_value > 0:
+        growth_percent = (uplift / current_total_value) * 100
+    else:
+        growth_percent = float('inf')
+    return {
+        "current": current_total_value,
+        "new": new_total_value,
+        "uplift": uplift,
+        "growth_percent": growth_percent,
+        "countries": scenario_df['COUNTRY'].unique(),
+    }
+
+
+def scenario_metrics(results):
+    return {
+        "Current Revenue": f"${results['current']:,.2f} M",
+        "Hypothetical Revenue": f"${results['new']:,.2f} M",
+        "Projected Growth": f"{results['growth_percent']:.2f}%",
+    }
+
+
+def revenue_comparison_bar(current_total_value, new_total_value):
+    fig = go.Figure(data=[
+        go.Bar(name='Current Revenue', x=['Revenue'], y=[current_total_value], marker_color='rgba(255, 255, 255, 0.3)'),
+        go.Bar(name='Hypothetical Revenue', x=['Revenue'], y=[new_total_value], marker_color='rgba(255, 255, 255, 0.7)')
+    ])
+    fig.update_layout(barmode='group', title_text='Revenue Comparison', yaxis_title="Value (USD Million)", template='plotly_dark', paper_bgcolor='#0d1b2a', plot_bgcolor='#0d1b2a', font_color='white')
+    return fig
+
+
+def trend_projection(forecast_models, commodity, countries):
+    """Projected value per market for the year after the models' last fitted year."""
+    return forecast_models.predict(forecast_models.last_year + 1, commodities=[commodity], countries=countries)
+
+
+def projected_markets_bar(projection, n=10):
+    top_projected = projection.nlargest(n, 'PROJECTED_VALUE_USD_MILLION')
+    fig_proj = px.bar(top_projected, x='PROJECTED_VALUE_USD_MILLION', y='COUNTRY', orientation='h',
+                      labels={'PROJECTED_VALUE_USD_MILLION': 'Projected Value (USD M)', 'COUNTRY': 'Country'},
+                      title="Top 10 Projected Markets")
+    fig_proj.update_layout(yaxis={'categoryorder':'total ascending'})
+    return fig_proj
+
+
+# --- MARKET RISK & DIVERSIFICATION ---
+def most_diversified(risk_df, n=15):
+    most = risk_df.sort_values(by="DIVERSIFICATION_SCORE", ascending=False).head(n)
+    return most[['COMMODITY_NAME', 'DIVERSIFICATION_SCORE', 'TOTAL_COMMODITY_VALUE']]
+
+
+def highest_risk(risk_df, n=15):
+    highest = risk_df.sort_values(by="CONCENTRATION_RISK_%", ascending=False).head(n)
+    return highest[['COMMODITY_NAME', 'TOP_MARKET', 'CONCENTRATION_RISK_%']]
+
+
+# --- DRIFT ALERTS ---
+# These read the drift history table (`export_hub.drift`), one period's rows at a time.
+def _drift_value(period_rows, kind, subject):
+    match = period_rows[(period_rows['KIND'] == kind) & (period_rows['SUBJECT'] == subject)]
+    return match['VALUE'].sum()
+
+
+def drift_metrics(period_rows):
+    alerts = period_rows[period_rows['ALERT']]
+    return {
+        "Rows Scored": f"{int(_drift_value(period_rows, 'rows', 'scored')):,}",
+        "Cluster Migrations": f"{int(_drift_value(period_rows, 'migration', 'total')):,}",
+        "Destination-Mix Alerts": f"{(alerts['KIND'] == 'mix_shift').sum()}",
+        "Price-Jump Alerts": f"{(alerts['KIND'] == 'price_jump').sum()}",
+    }
+
+
+def drift_alerts_table(period_rows):
+    alerts = period_rows[period_rows['ALERT']]
+    return alerts[['KIND', 'SUBJECT', 'VALUE', 'BASELINE']].sort_values(['KIND', 'VALUE'], ascending=[True, False])
+
+
+def migration_matrix(period_rows):
+    moves = period_rows[(period_rows['KIND'] == 'migration') & (period_rows['SUBJECT'] != 'total')]
+    if moves.empty:
+        return pd.DataFrame()
+    pairs = moves['SUBJECT'].str.split(' → ', expand=True)
+    return moves.assign(FROM=pairs[0], TO=pairs[1]).pivot_table(
+        index='FROM', columns='TO', values='VALUE', aggfunc='sum', fill_value=0).astype(int)
+
+
+def cluster_share_change(period_rows):
+    shares = period_rows[period_rows['KIND'] == 'cluster_share']
+    fig = go.Figure(data=[
+        go.Bar(name='Baseline', x=shares['SUBJECT'], y=shares['BASELINE']),
+        go.Bar(name='New Period', x=shares['SUBJECT'], y=shares['VALUE']),
+    ])
+    fig.update_layout(barmode='group', title_text='Share of Export Value by Cluster', yaxis_tickformat='.0%')
+    return fig
+
+
+def drift_alert_history(history):
+    counts = history[history['ALERT']].groupby(['PERIOD', 'KIND']).size().rename('ALERTS').reset_index()
+    return px.bar(counts, x='PERIOD', y='ALERTS', color='KIND', title="Alerts per Period")
@@ -0,0 +1,168 @@
+"""Per-series export value forecasting.
+
+Fits a linear trend of VALUE_USD_MILLION over YEAR for every
+(commodity, country) series. Series are fitted in chunks across joblib
+workers, the fitted parameters are kept in a compact array-backed
+`ForecastTable`, and projections for any selection are one vectorized
+evaluation of `intercept + slope * (year - center)`.
+
+Run `python -m export_hub.forecasting` to refit from the yearly sources and
+write `data/forecast_models.npz`. The pipeline's `forecast` stage does the
+same whenever a yearly source changes.
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed, effective_n_jobs
+
+from export_hub.data import DATA_DIR, load_yearly_exports
+
+MODELS_PATH = DATA_DIR / "forecast_models.npz"
+# About a second of fitting, roughly what starting a worker process costs;
+# with fewer series per worker the fit runs serially in this process
+MIN_CHUNK_SIZE = 4_000_000
+
+
+def _fit_chunk(sid, t, y, n_series):
+    """Closed-form least squares for every series id in one chunk."""
+    n = np.bincount(sid, minlength=n_series).astype(float)
+    sx = np.bincount(sid, t, minlength=n_series)
+    sy = np.bincount(sid, y, minlength=n_series)
+    sxx = np.bincount(sid, t * t, minlength=n_series)
+    sxy = np.bincount(sid, t * y, minlength=n_series)
+
+    center = np.divide(sx, n, out=np.zeros(n_series), where=n > 0)
+    mean_y = np.divide(sy, n, out=np.zeros(n_series), where=n > 0)
+    var_t = sxx - n * center ** 2
+    cov_ty = sxy - n * center * mean_y
+    # Single-year series have no trend; they are projected flat.
+    slope = np.divide(cov_ty, var_t, out=np.zeros(n_series), where=var_t > 1e-12)
+
+    resid = y - (mean_y[sid] + slope[sid] * (t - center[sid]))
+    sse = np.bincount(sid, resid * resid, minlength=n_series)
+    resid_std = np.sqrt(np.divide(sse, n - 2, out=np.zeros(n_series), where=n > 2))
+    return n, center, mean_y, slope, resid_std
+
+
+class ForecastTable:
+    """Fitted trend parameters for all series, stored as parallel NumPy arrays."""
+
+    def __init__(self, commodities, countries, commodity_code, country_code,
+                 center, intercept, slope, resid_std, n_obs, last_year):
+        self.commodities = np.asarray(commodities, dtype=object)
+        self.countries = np.asarray(countries, dtype=object)
+        self.commodity_code = np.asarray(commodity_code, dtype=np.int32)
+        self.country_code = np.asarray(country_code, dtype=np.int32)
+        self.center = np.asarray(center, dtype=np.float32)
+        self.intercept = np.asarray(intercept, dtype=np.float32)
+        self.slope = np.asarray(slope, dtype=np.float32)
+        self.resid_std = np.asarray(resid_std, dtype=np.float32)
+        self.n_obs = np.asarray(n_obs, dtype=np.uint8)
+        self.last_year = int(last_year)
+
+    def __len__(self):
+        return len(self.intercept)
+
+    def select(self, commodities=None, countries=None):
+        """Boolean mask of the series matching the given names (None = all)."""
+        mask = np.ones(len(self), dtype=bool)
+        if commodities is not None:
+            codes = np.flatnonzero(np.isin(self.commodities, list(commodities)))
+            mask &= np.isin(self.commodity_code, codes)
+        if countries is not None:
+            codes = np.flatnonzero(np.isin(self.countries, list(countries)))
+            mask &= np.isin(self.country_code, codes)
+        return mask
+
+    def predict(self, year, commodities=None, countries=None):
+        """Project every selected series to `year` in one vectorized call."""
+        mask = self.select(commodities, countries)
+        value = self.intercept[mask] + self.slope[mask] * (np.float32(year) - self.center[mask])
+        return pd.DataFrame({
+            'COMMODITY_NAME': self.commodities[self.commodity_code[mask]],
+            'COUNTRY': self.countries[self.country_code[mask]],
+            'YEAR': year,
+            'PROJECTED_VALUE_USD_MILLION': np.clip(value, 0, None),
+            'RESID_STD': self.resid_std[mask],
+        })
+
+    def save(self, path=MODELS_PATH):
+        np.savez_compressed(
+            path,
+            commodities=self.commodities.astype(str), countries=self.countries.astype(str),
+            commodity_code=self.commodity_code, country_code=self.country_code,
+            center=self.center, intercept=self.intercept, slope=self.slope,
+            resid_std=self.resid_std, n_obs=self.n_obs, last_year=self.last_year,
+        )
+
+    @classmethod
+    def load(cls, path=MODELS_PATH):
+        with np.load(path) as npz:
+            return cls(
+                commodities=npz['commodities'], countries=npz['countries'],
+                commodity_code=npz['commodity_code'], country_code=npz['country_code'],
+                center=npz['center'], intercept=npz['intercept'], slope=npz['slope'],
+                resid_std=npz['resid_std'], n_obs=npz['n_obs'], last_year=npz['last_year'],
+            )
+
+
+def fit_series_models(df, value_col='VALUE_USD_MILLION', period_col='YEAR', n_jobs=-1, chunk_size=None):
+    """Fit a trend per (commodity, country) series and return a `ForecastTable`.
+
+    By default the series are split into two chunks per worker (but no
+    fewer than `MIN_CHUNK_SIZE` series each), so every worker gets work
+    and uneven chunks still balance out. Tables too small to give every
+    worker `MIN_CHUNK_SIZE` series are fitted serially, since the closed-form
+    fit is much cheaper than starting worker processes.
+    """
+    series = (
+        df.groupby(['COMMODITY_NAME', 'COUNTRY', period_col], observed=True)[value_col]
+        .sum()
+        .reset_index()
+    )
+    commodity = pd.Categorical(series['COMMODITY_NAME'])
+    country = pd.Categorical(series['COUNTRY'])
+    # Rows are already sorted by (commodity, country), so series ids are contiguous.
+    sid = series.groupby(['COMMODITY_NAME', 'COUNTRY'], sort=False, observed=True).ngroup().to_numpy()
+    t = series[period_col].to_numpy(dtype=float)
+    y = series[value_col].to_numpy(dtype=float)
+    n_series = int(sid.max()) + 1 if len(sid) else 0
+    workers = effective_n_jobs(n_jobs)
+    if n_series < workers * MIN_CHUNK_SIZE:
+        n_jobs = workers = 1
+    if chunk_size is None:
+        chunk_size = max(-(-n_series // (2 * workers)), MIN_CHUNK_SIZE)
+
+    bounds = np.arange(0, n_series + chunk_size, chunk_size)
+    cuts = np.searchsorted(sid, bounds)
+    jobs = [
+        (sid[lo:hi] - start, t[lo:hi], y[lo:hi], min(chunk_size, n_series - start))
+        for start, lo, hi in zip(bounds[:-1], cuts[:-1], cuts[1:])
+        if hi > lo
+    ]
+    results = Parallel(n_jobs=n_jobs)(delayed(_fit_chunk)(*job) for job in jobs)
+    n, center, intercept, slope, resid_std = (np.concatenate(parts) for parts in zip(*results))
+
+    first = np.searchsorted(sid, np.arange(n_series))
+    return ForecastTable(
+        commodities=commodity.categories, countries=country.categories,
+        commodity_code=commodity.codes[first], country_code=country.codes[first],
+        center=center, intercept=intercept, slope=slope, resid_std=resid_std,
+        n_obs=n, last_year=series[period_col].max(),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit per-series export value trends.")
+    parser.add_argument("--out", default=str(MODELS_PATH), help="Where to write the model table (.npz).")
+    parser.add_argument("--jobs", type=int, default=-1, help="joblib worker count (-1 = all cores).")
+    args = parser.parse_args()
+
+    table = fit_series_models(load_yearly_exports(), n_jobs=args.jobs)
+    table.save(args.out)
+    print(f"Fitted {len(table):,} series through {table.last_year}; saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
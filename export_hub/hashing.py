@@ -0,0 +1,44 @@
+"""Content hashes shared by the pipeline cache, the snapshot and the job queue.
+
+Kept apart from `export_hub.pipeline` so that opening a snapshot or keying
+a job does not import the pipeline's stages (and scikit-learn with them).
+"""
+import hashlib
+import pickle
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+def sha(*parts):
+    """SHA-256 hex digest of `parts`, each as bytes or its string form."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else str(part).encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def content_hash(obj):
+    """Stable hash of a stage output.
+
+    DataFrames and arrays are hashed by content and fitted estimators by their
+    attributes, so a result reloaded from the cache hashes like a fresh one.
+    """
+    if isinstance(obj, pd.DataFrame):
+        row_hashes = pd.util.hash_pandas_object(obj, index=False).to_numpy()
+        return sha(list(obj.columns), [str(t) for t in obj.dtypes], row_hashes.tobytes())
+    if isinstance(obj, np.ndarray):
+        if obj.dtype == object:
+            return sha(obj.shape, obj.tolist())
+        return sha(obj.dtype, obj.shape, np.ascontiguousarray(obj).tobytes())
+    if isinstance(obj, dict):
+        return sha(*(f"{k}={content_hash(v)}" for k, v in sorted(obj.items())))
+    if hasattr(obj, "__dict__") and not isinstance(obj, type):
+        return sha(type(obj).__qualname__, content_hash(vars(obj)))
+    return sha(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def file_hash(path):
+    return sha(Path(path).read_bytes())
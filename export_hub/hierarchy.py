@@ -0,0 +1,83 @@
+"""Hierarchical Cluster -> Commodity -> Country aggregates for the Treemap mode.
+
+`HierarchyTree` groups the data once per level and keeps every parent's
+children sorted by value. The app then asks for a bounded window of the
+tree (the focused node plus a few levels below it, each capped at top-N
+children with an "Other" bucket), so the figure payload stays small no
+matter how many commodities or countries are in the data.
+"""
+import pandas as pd
+
+LEVELS = ('Cluster', 'COMMODITY_NAME', 'COUNTRY')
+OTHER_LABEL = "Other"
+ROOT_LABEL = "All Exports"
+# Commodity names contain "/" (e.g. SHEEP/GOAT MEAT), so ids use a different separator.
+ID_SEP = "|"
+
+
+class HierarchyTree:
+    """Precomputed per-level aggregates with sorted children per parent."""
+
+    def __init__(self, df, levels=LEVELS, value_col='VALUE_USD_MILLION'):
+        self.levels = tuple(levels)
+        self.total = float(df[value_col].sum())
+        self._children = {}
+        for depth in range(1, len(self.levels) + 1):
+            keys = list(self.levels[:depth])
+            sums = df.groupby(keys, observed=True)[value_col].sum().reset_index()
+            sums[keys] = sums[keys].astype(str).apply(lambda s: s.str.strip())
+            sums = sums.sort_values(value_col, ascending=False, kind='stable')
+            parents = keys[:-1]
+            grouped = sums.groupby(parents, sort=False) if parents else [((), sums)]
+            for parent, group in grouped:
+                parent = parent if isinstance(parent, tuple) else (parent,)
+                self._children[parent] = (
+                    group[keys[-1]].to_numpy(),
+                    group[value_col].to_numpy(dtype=float),
+                )
+
+    def is_leaf(self, path):
+        return len(path) >= len(self.levels)
+
+    def value(self, path):
+        if not path:
+            return self.total
+        labels, values = self._children.get(tuple(path[:-1]), ((), ()))
+        for label, value in zip(labels, values):
+            if label == path[-1]:
+                return float(value)
+        return 0.0
+
+    def children(self, path, top_n=10):
+        """Top-N children of `path` as (label, value) pairs plus an "Other" bucket."""
+        labels, values = self._children.get(tuple(path), ((), ()))
+        top = list(zip(labels[:top_n], values[:top_n]))
+        if len(labels) > top_n:
+            top.append((OTHER_LABEL, float(values[top_n:].sum())))
+        return top
+
+    def view(self, path=(), depth=2, top_n=10):
+        """Plotly treemap/sunburst arrays for `path` and `depth` levels below it.
+
+        Node ids are the ID_SEP-joined path from the root, so they are unique
+        even when a label appears under several parents.
+        """
+        path = tuple(path)
+        root_id = ID_SEP.join(path) or ROOT_LABEL
+        ids, labels, parents, values = [root_id], [path[-1] if path else ROOT_LABEL], [""], [self.value(path)]
+        frontier = [(path, root_id)]
+        for _ in range(depth):
+            next_frontier = []
+            for node, node_id in frontier:
+                if self.is_leaf(node):
+                    continue
+                for label, value in self.children(node, top_n):
+                    child_id = f"{node_id}{ID_SEP}{label}" if node or label == OTHER_LABEL else label
+                    ids.append(child_id)
+                    labels.append(label)
+                    parents.append(node_id)
+                    values.append(value)
+                    if label != OTHER_LABEL:
+                        next_frontier.append((node + (label,), child_id))
+            frontier = next_frontier
+        return pd.DataFrame({'id': ids, 'label': labels, 'parent': parents, 'value': values})
@@ -0,0 +1,264 @@
+"""In-process background jobs for expensive recomputations.
+
+Long tasks (rebuilding the data files, regenerating batch reports) run on a
+bounded worker pool instead of the Streamlit script thread. Each submitted
+job gets an id and reports progress. It can be cancelled, and a request
+identical to one that is already queued or running returns that job instead
+of starting a new one (finished results can be reused too, on request).
+The dashboard polls `JobQueue.jobs` and swaps in the results once a job is
+done.
+
+A job function receives a `JobContext` as its first argument:
+
+    def task(ctx, n):
+        for i in range(n):
+            ctx.check()                  # raises JobCancelled once cancelled
+            ...
+            ctx.report((i + 1) / n, f"step {i + 1} of {n}")
+        return result
+
+With `executor="process"`, functions and arguments must be picklable, and
+the function must not start its own process pool.
+"""
+import multiprocessing
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Optional
+
+from export_hub.data import DATA_DIR, YEARLY_SOURCES
+from export_hub.hashing import content_hash
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+ACTIVE = (QUEUED, RUNNING)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job function when its job has been cancelled."""
+
+
+class JobContext:
+    """What a running job function sees: progress reporting and cancellation checks."""
+
+    def __init__(self, job_id, updates, cancel_event):
+        self.job_id = job_id
+        self._updates = updates
+        self._cancel = cancel_event
+
+    def report(self, progress=None, message=None):
+        """Record progress as a fraction in [0, 1] and/or a status message."""
+        self._updates.put((self.job_id, "progress", (progress, message)))
+
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def check(self):
+        if self.cancelled():
+            raise JobCancelled(self.job_id)
+
+
+@dataclass
+class Job:
+    id: str
+    key: str
+    name: str
+    status: str = QUEUED
+    progress: float = 0.0
+    message: str = ""
+    result: Any = None
+    error: Optional[str] = None
+    submitted: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+
+    @property
+    def active(self):
+        return self.status in ACTIVE
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+
+def _run_job(func, ctx, args, kwargs):
+    # Runs in the worker thread or process
+    ctx._updates.put((ctx.job_id, "start", time.time()))
+    ctx.check()
+    return func(ctx, *args, **kwargs)
+
+
+def job_key(func, args, kwargs):
+    """Identity of a request, used to deduplicate identical submissions."""
+    name = f"{func.__module__}.{func.__qualname__}"
+    return content_hash({"func": name, "args": list(args), "kwargs": kwargs})
+
+
+class JobQueue:
+    """A bounded pool of background workers with job ids, progress, cancellation and dedup."""
+
+    def __init__(self, max_workers=1, executor="thread", max_history=50):
+        if executor == "process":
+            # Progress and cancellation cross the process boundary through a manager
+            self._manager = multiprocessing.Manager()
+            self._pool = ProcessPoolExecutor(max_workers=max_workers)
+            self._updates = self._manager.Queue()
+            self._new_event = self._manager.Event
+        elif executor == "thread":
+            self._manager = None
+            self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+            self._updates = queue.Queue()
+            self._new_event = threading.Event
+        else:
+            raise ValueError(f"executor must be 'thread' or 'process', not {executor!r}")
+        self.max_history = max_history
+        # Re-entrant: cancelling a queued future runs its done callback in the cancelling thread
+        self._lock = threading.RLock()
+        self._jobs = OrderedDict()
+        self._by_key = {}
+        self._futures = {}
+        self._cancel_events = {}
+        threading.Thread(target=self._apply_updates, name="job-updates", daemon=True).start()
+
+    def submit(self, func, *args, name=None, key=None, reuse_result=False, **kwargs):
+        """Queue `func(ctx, *args, **kwargs)`.
+
+        An identical request (same `key`, by default derived from the function
+        and arguments) that is queued or running is returned instead; with
+        `reuse_result`, so is a finished one.
+        """
+        key = key or job_key(func, args, kwargs)
+        with self._lock:
+            existing = self._by_key.get(key)
+            if existing is not None and (existing.active or (reuse_result and existing.status == DONE)):
+                return existing
+            job = Job(id=uuid.uuid4().hex[:12], key=key, name=name or func.__name__)
+            cancel_event = self._new_event()
+            ctx = JobContext(job.id, self._updates, cancel_event)
+            self._jobs[job.id] = job
+            self._by_key[key] = job
+            self._cancel_events[job.id] = cancel_event
+            future = self._pool.submit(_run_job, func, ctx, args, kwargs)
+            self._futures[job.id] = future
+            self._trim()
+        future.add_done_callback(lambda f, job=job: self._finish(job, f))
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def jobs(self, active_only=False):
+        """Known jobs, oldest first."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [j for j in jobs if j.active] if active_only else jobs
+
+    def cancel(self, job_id):
+        """Cancel a queued job, or ask a running one to stop at its next `ctx.check()`."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or not job.active:
+                return False
+            self._cancel_events[job_id].set()
+            if self._futures[job_id].cancel():
+                self._mark(job, CANCELLED)
+            else:
+                job.message = "Cancelling..."
+        return True
+
+    def shutdown(self, wait=True):
+        for job in self.jobs(active_only=True):
+            self.cancel(job.id)
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+        if self._manager is not None:
+            self._manager.shutdown()
+
+    def _mark(self, job, status, result=None, error=None):
+        job.status, job.result, job.error = status, result, error
+        job.finished = time.time()
+        if status == DONE:
+            job.progress = 1.0
+
+    def _finish(self, job, future):
+        with self._lock:
+            if job.status == CANCELLED:
+                return
+            try:
+                self._mark(job, DONE, result=future.result())
+            except (JobCancelled, CancelledError):
+                self._mark(job, CANCELLED)
+            except Exception as e:
+                self._mark(job, FAILED, error=f"{type(e).__name__}: {e}")
+            self._futures.pop(job.id, None)
+            self._cancel_events.pop(job.id, None)
+
+    def _apply_updates(self):
+        while True:
+            try:
+                job_id, kind, payload = self._updates.get()
+            except (EOFError, OSError):
+                return  # The manager was shut down
+            with self._lock:
+                job = self._jobs.get(job_id)
+                # Updates can arrive after the job has finished; those are stale
+                if job is None or not job.active:
+                    continue
+                if kind == "start":
+                    job.status, job.started = RUNNING, payload
+                elif kind == "progress":
+                    progress, message = payload
+                    if progress is not None:
+                        job.progress = min(max(float(progress), 0.0), 1.0)
+                    if message is not None:
+                        job.message = message
+
+    def _trim(self):
+        # Forget the oldest finished jobs beyond max_history (and their results)
+        finished = [j for j in self._jobs.values() if not j.active]
+        for job in finished[:max(len(finished) - self.max_history, 0)]:
+            del self._jobs[job.id]
+            if self._by_key.get(job.key) is job:
+                del self._by_key[job.key]
+
+
+# --- JOBS USED BY THE DASHBOARD ---
+def rebuild_data_files(ctx, source=str(YEARLY_SOURCES[2022]), out_dir=str(DATA_DIR), force=False):
+    """Rerun the stale pipeline stages (re-clustering, derived tables) into `out_dir`."""
+    from export_hub.pipeline import Pipeline, default_stages
+
+    pipeline = Pipeline(default_stages(Path(source), Path(out_dir)))
+    total, done = len(pipeline.stages), []
+
+    def log(line):
+        done.append(line)
+        ctx.report(len(done) / total, line)
+        ctx.check()  # Stops before further stages are scheduled
+
+    pipeline.run(force=force, log=log)
+    return done
+
+
+def generate_batch_reports(ctx, out_dir, presets=None, jobs=2):
+    """Regenerate the batch reports (see `export_hub.reports`); returns the manifest.
+
+    Runs inside the app's server process, so the report pool is small and
+    its workers are spawned rather than forked from the threaded server.
+    """
+    from export_hub import reports
+
+    presets = presets or reports.default_presets(reports.load_report_data()[0])
+    done = []
+
+    def log(line):
+        done.append(line)
+        ctx.report(len(done) / len(presets), line.strip())
+        ctx.check()
+
+    return reports.generate_reports(presets, out_dir, jobs=jobs, log=log,
+                                    mp_context=multiprocessing.get_context('spawn'))
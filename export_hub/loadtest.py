@@ -0,0 +1,404 @@
+"""Concurrent-session load test for the dashboard.
+
+Simulates N analysts at once, each replaying a randomized interaction
+script (switching `analysis_mode`, moving the value slider, picking
+commodities, dragging scenario sliders) and reports rerun latency
+percentiles, throughput and peak RSS.
+
+Two targets are supported:
+
+* `server` (default) starts `streamlit run app.py` headless and drives every
+  session over Streamlit's websocket protocol, exactly like a browser tab.
+  Sessions share the server's caches, which is what this test is for.
+* `apptest` runs each session as a `streamlit.testing` AppTest in its own
+  process (AppTest instances cannot share a process safely). Caches are
+  per process, so this measures CPU contention rather than cache sharing.
+
+Usage:
+    python -m export_hub.loadtest --sessions 8 --steps 20
+    python -m export_hub.loadtest --url http://localhost:8501 --server-pid 1234
+    python -m export_hub.loadtest --target apptest --sessions 4
+"""
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+
+from export_hub.data import ROOT_DIR
+
+APP_PATH = ROOT_DIR / "app.py"
+
+# --- WIDGET LABELS USED BY THE INTERACTION SCRIPT ---
+MODE_LABEL = "Choose how you want to explore the data:"
+VALUE_LABEL = "Filter by Value (USD Million)"
+COMMODITY_LABELS = ("Search for a commodity", "Select a Commodity to Analyze")
+SCENARIO_LABELS = ("Price Increase (%)", "Quantity Increase (%)")
+COUNTRY_LABELS = ("Select Country 1", "Select Country 2")
+RISK_VIEW_LABEL = "Select View"
+
+
+@dataclass
+class Widget:
+    label: str
+    kind: str
+    id: str = ""
+    options: list = field(default_factory=list)
+    min: float = 0.0
+    max: float = 0.0
+    is_range: bool = False
+    fragment_id: str = ""
+
+
+# --- INTERACTION SCRIPT ---
+def next_action(rng, widgets):
+    """Pick the next (action, label, value) an analyst would perform on the visible widgets."""
+    candidates = [("switch_mode", MODE_LABEL, 4)]
+    if VALUE_LABEL in widgets:
+        candidates.append(("value_slider", VALUE_LABEL, 3))
+    candidates += [("commodity", label, 3) for label in COMMODITY_LABELS if label in widgets]
+    candidates += [("scenario_slider", label, 2) for label in SCENARIO_LABELS if label in widgets]
+    candidates += [("country", label, 2) for label in COUNTRY_LABELS if label in widgets]
+    if RISK_VIEW_LABEL in widgets:
+        candidates.append(("risk_view", RISK_VIEW_LABEL, 1))
+
+    action, label, _ = rng.choices(candidates, weights=[w for _, _, w in candidates])[0]
+    widget = widgets[label]
+    if widget.kind == "slider":
+        lo, hi = widget.min, widget.max
+        if widget.is_range:
+            a, b = sorted(rng.uniform(lo, hi) for _ in range(2))
+            return action, label, (lo, b) if rng.random() < 0.5 else (a, hi)
+        return action, label, rng.randint(int(lo), int(hi))
+    return action, label, rng.choice(widget.options)
+
+
+def run_script(session, steps, seed, think_time=0.0):
+    """Replay `steps` actions on a session; returns [(action, seconds, ok)]."""
+    rng = random.Random(seed)
+    results = [("initial_load", *session.start())]
+    for _ in range(steps):
+        action, label, value = next_action(rng, session.widgets)
+        results.append((action, *session.set(label, value)))
+        if think_time:
+            time.sleep(rng.uniform(0, 2 * think_time))
+    session.close()
+    return results
+
+
+# --- APPTEST TARGET ---
+class AppTestSession:
+    """A session backed by an in-process `streamlit.testing` AppTest."""
+
+    def __init__(self, app_path, timeout=120):
+        from streamlit.testing.v1 import AppTest
+        self.at = AppTest.from_file(str(app_path), default_timeout=timeout)
+
+    def _widgets(self):
+        widgets = {}
+        for kind in ("selectbox", "multiselect", "slider", "radio", "checkbox"):
+            for element in getattr(self.at, kind):
+                widget = Widget(label=element.label, kind=kind, id=element.id)
+                if kind in ("selectbox", "multiselect", "radio"):
+                    widget.options = list(element.options)
+                elif kind == "slider":
+                    widget.min, widget.max = float(element.min), float(element.max)
+                    widget.is_range = isinstance(element.value, (list, tuple))
+                widgets[element.label] = (widget, element)
+        return widgets
+
+    @property
+    def widgets(self):
+        return {label: widget for label, (widget, _) in self._widgets().items()}
+
+    def _timed(self, fn):
+        start = time.perf_counter()
+        fn()
+        return time.perf_counter() - start, not self.at.exception
+
+    def start(self):
+        return self._timed(self.at.run)
+
+    def set(self, label, value):
+        _, element = self._widgets()[label]
+        return self._timed(lambda: element.set_value(value).run())
+
+    def close(self):
+        pass
+
+
+def _apptest_worker(app_path, steps, seed, think_time):
+    sys.path.insert(0, str(app_path.parent))
+    return run_script(AppTestSession(app_path), steps, seed, think_time)
+
+
+# --- SERVER TARGET ---
+class ServerSession:
+    """A browser-like session speaking Streamlit's websocket protocol."""
+
+    def __init__(self, url, timeout=120):
+        self.url = url.rstrip("/").replace("http", "ws", 1) + "/_stcore/stream"
+        self.timeout = timeout
+        self.widgets = {}
+        self._states = {}
+        self._messages = {}
+        self._loop = asyncio.new_event_loop()
+        self._conn = None
+
+    def _await(self, coro):
+        return self._loop.run_until_complete(coro)
+
+    def start(self):
+        from tornado.websocket import websocket_connect
+
+        async def connect():
+            return await websocket_connect(self.url, subprotocols=["streamlit"])
+
+        self._conn = self._await(connect())
+        return self._rerun(fragment_id="")
+
+    def set(self, label, value):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        widget = self.widgets[label]
+        state = WidgetState(id=widget.id)
+        if widget.kind in ("selectbox", "radio"):
+            state.int_value = widget.options.index(value)
+        elif widget.kind == "multiselect":
+            state.int_array_value.data.extend(widget.options.index(v) for v in value)
+        elif widget.kind == "slider":
+            state.double_array_value.data.extend(value if widget.is_range else [value])
+        elif widget.kind == "checkbox":
+            state.bool_value = bool(value)
+        else:
+            raise ValueError(f"Unsupported widget kind: {widget.kind}")
+        self._states[widget.id] = state
+        return self._rerun(fragment_id=widget.fragment_id)
+
+    def _rerun(self, fragment_id):
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        msg = BackMsg()
+        msg.rerun_script.fragment_id = fragment_id
+        msg.rerun_script.widget_states.widgets.extend(self._states.values())
+
+        start = time.perf_counter()
+        self._await(self._send(msg.SerializeToString()))
+        seen, ok = {}, True
+        while True:
+            raw = self._await(self._receive())
+            if raw is None:
+                raise ConnectionError("Streamlit server closed the session")
+            fwd = ForwardMsg()
+            fwd.ParseFromString(raw)
+            kind = fwd.WhichOneof("type")
+            if kind == "ref_hash":
+                fwd = self._messages[fwd.ref_hash]
+                kind = fwd.WhichOneof("type")
+            elif fwd.hash:
+                self._messages[fwd.hash] = fwd
+            if kind == "delta" and fwd.delta.WhichOneof("type") == "new_element":
+                ok &= self._record_element(fwd, seen)
+            elif kind == "script_finished" and fwd.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                ok &= fwd.script_finished != ForwardMsg.FINISHED_WITH_COMPILE_ERROR
+                break
+        elapsed = time.perf_counter() - start
+
+        # Fragment reruns only resend the fragment's own widgets.
+        if fragment_id:
+            kept = {label: w for label, w in self.widgets.items() if w.fragment_id != fragment_id}
+            seen = {**kept, **seen}
+        self.widgets = seen
+        active = {w.id for w in self.widgets.values()}
+        self._states = {wid: s for wid, s in self._states.items() if wid in active}
+        return elapsed, ok
+
+    async def _send(self, payload):
+        await self._conn.write_message(payload, binary=True)
+
+    async def _receive(self):
+        return await asyncio.wait_for(self._conn.read_message(), self.timeout)
+
+    def _record_element(self, fwd, seen):
+        element = fwd.delta.new_element
+        kind = element.WhichOneof("type")
+        if kind == "exception":
+            return False
+        if kind in ("selectbox", "multiselect", "slider", "radio", "checkbox"):
+            proto = getattr(element, kind)
+            widget = Widget(label=proto.label, kind=kind, id=proto.id, fragment_id=fwd.delta.fragment_id)
+            if kind in ("selectbox", "multiselect", "radio"):
+                widget.options = list(proto.options)
+            elif kind == "slider":
+                widget.min, widget.max = proto.min, proto.max
+                widget.is_range = len(proto.default) == 2
+            seen[proto.label] = widget
+        return True
+
+    def close(self):
+        if self._conn is not None:
+            self._await(self._close())
+        self._loop.close()
+
+    async def _close(self):
+        self._conn.close()
+        await asyncio.sleep(0)
+
+
+def start_server(app_path, port, quiet=True):
+    """Start a headless Streamlit server and wait until it reports healthy."""
+    output = subprocess.DEVNULL if quiet else None
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", str(app_path),
+         "--server.headless", "true", "--server.port", str(port),
+         "--browser.gatherUsageStats", "false"],
+        cwd=app_path.parent, stdout=output, stderr=output,
+    )
+    url = f"http://localhost:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"{url}/_stcore/health", timeout=1) as resp:
+                if resp.status == 200:
+                    return proc, url
+        except OSError:
+            time.sleep(0.25)
+    proc.terminate()
+    raise RuntimeError(f"Streamlit server did not become healthy on port {port}")
+
+
+def peak_rss_mb(pid):
+    """Peak resident set size of a process (Linux /proc VmHWM), in MB; None where /proc is unavailable."""
+    try:
+        with open(f"/proc/{pid}/status") as fh:
+            for line in fh:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def children_peak_rss_mb():
+    """Peak RSS of the largest finished child process, in MB; None where `resource` is unavailable (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+
+
+# --- RUNNER & REPORT ---
+def summarize(results, wall_seconds, peak_rss):
+    """Latency percentiles overall and per action, plus throughput and RSS."""
+    rows = [r for session in results for r in session]
+    latencies = np.array([seconds for _, seconds, _ in rows])
+    by_action = {}
+    for action, seconds, _ in rows:
+        by_action.setdefault(action, []).append(seconds)
+
+    def pct(values):
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        return {"count": len(values), "p50": p50, "p95": p95, "p99": p99, "max": float(np.max(values))}
+
+    return {
+        "sessions": len(results),
+        "reruns": len(rows),
+        "errors": sum(not ok for _, _, ok in rows),
+        "wall_seconds": wall_seconds,
+        "throughput_per_s": len(rows) / wall_seconds if wall_seconds else float("nan"),
+        "peak_rss_mb": peak_rss,
+        "latency": pct(latencies),
+        "latency_by_action": {action: pct(v) for action, v in sorted(by_action.items())},
+    }
+
+
+def format_report(summary):
+    lat = summary["latency"]
+    lines = [
+        f"Sessions: {summary['sessions']}   Reruns: {summary['reruns']}   Errors: {summary['errors']}",
+        f"Wall time: {summary['wall_seconds']:.2f}s   Throughput: {summary['throughput_per_s']:.2f} reruns/s",
+        f"Peak RSS: {summary['peak_rss_mb']:.1f} MB" if summary['peak_rss_mb'] is not None else "Peak RSS: n/a",
+        f"Rerun latency (s): p50 {lat['p50']:.3f}   p95 {lat['p95']:.3f}   p99 {lat['p99']:.3f}   max {lat['max']:.3f}",
+        "",
+        f"{'action':<18}{'count':>7}{'p50':>9}{'p95':>9}{'p99':>9}",
+    ]
+    for action, s in summary["latency_by_action"].items():
+        lines.append(f"{action:<18}{s['count']:>7}{s['p50']:>9.3f}{s['p95']:>9.3f}{s['p99']:>9.3f}")
+    return "\n".join(lines)
+
+
+def run_load_test(target="server", sessions=8, steps=20, seed=0, think_time=0.0,
+                  app_path=APP_PATH, url=None, server_pid=None, port=8599):
+    """Run `sessions` concurrent scripted sessions and return the summary dict."""
+    seeds = [seed + i for i in range(sessions)]
+    if target == "apptest":
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=sessions) as pool:
+            results = list(pool.map(_apptest_worker, [app_path] * sessions, [steps] * sessions,
+                                    seeds, [think_time] * sessions))
+        wall = time.perf_counter() - start
+        return summarize(results, wall, children_peak_rss_mb())
+
+    proc = None
+    if url is None:
+        proc, url = start_server(app_path, port)
+        server_pid = proc.pid
+    try:
+        barrier = threading.Barrier(sessions)
+
+        def session_worker(session_seed):
+            session = ServerSession(url)
+            barrier.wait()
+            return run_script(session, steps, session_seed, think_time)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=sessions) as pool:
+            results = list(pool.map(session_worker, seeds))
+        wall = time.perf_counter() - start
+        peak = peak_rss_mb(server_pid) if server_pid else None
+        return summarize(results, wall, peak)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the dashboard with concurrent scripted sessions.")
+    parser.add_argument("--target", choices=["server", "apptest"], default="server")
+    parser.add_argument("--sessions", type=int, default=8, help="Concurrent sessions.")
+    parser.add_argument("--steps", type=int, default=20, help="Interactions per session after the first load.")
+    parser.add_argument("--think", type=float, default=0.0, help="Mean think time between interactions (s).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--app", default=str(APP_PATH), help="Streamlit script to test.")
+    parser.add_argument("--url", help="Use an already running server instead of starting one.")
+    parser.add_argument("--server-pid", type=int, help="PID of --url's server, for peak RSS.")
+    parser.add_argument("--port", type=int, default=8599, help="Port for the server this tool starts.")
+    parser.add_argument("--json", help="Also write the summary to this JSON file.")
+    args = parser.parse_args()
+
+    summary = run_load_test(
+        target=args.target, sessions=args.sessions, steps=args.steps, seed=args.seed,
+        think_time=args.think, app_path=Path(args.app).resolve(),
+        url=args.url, server_pid=args.server_pid, port=args.port,
+    )
+    print(format_report(summary))
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(summary, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
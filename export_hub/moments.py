@@ -0,0 +1,144 @@
+"""Mergeable summary statistics per (cluster, commodity, country) cell.
+
+Each cell stores, for every metric, the count of finite values, their sum,
+the sum of squared deviations from the cell mean (M2, as in Welford's
+algorithm), the minimum and the maximum. Cells combine exactly with Chan et
+al.'s parallel update,
+
+    n = n_a + n_b
+    M2 = M2_a + M2_b + n_a * n_b / n * (mean_a - mean_b) ** 2
+
+so a profile for any selection of clusters, commodities, countries or price
+flags comes from merging stored cells in O(cells), without reading rows.
+Medians cannot be merged this way, so profiles report mean, std, min and max.
+
+The pipeline writes the table to `data/cell_moments.npz`.
+"""
+import numpy as np
+import pandas as pd
+
+from export_hub.anomalies import FLAG_COLUMN, FLAG_NON_FINITE, OUTLIER_FLAGS
+from export_hub.data import DATA_DIR
+
+MOMENTS_PATH = DATA_DIR / "cell_moments.npz"
+CELL_KEYS = ('Cluster', 'COMMODITY_NAME', 'COUNTRY', FLAG_COLUMN)
+METRICS = ('VALUE_USD_MILLION', 'QUANTITY_KGS', 'PRICE_PER_KG')
+STATS = ('n', 'sum', 'm2', 'min', 'max')
+
+
+def _col(metric, stat):
+    return f"{metric}:{stat}"
+
+
+class MomentTable:
+    """Per-cell moments, one row per cell: the key columns plus `metric:stat` columns."""
+
+    def __init__(self, cells, keys=CELL_KEYS, metrics=METRICS):
+        self.cells = cells
+        self.keys = tuple(keys)
+        self.metrics = tuple(metrics)
+
+    def __len__(self):
+        return len(self.cells)
+
+    @classmethod
+    def from_frame(cls, df, keys=CELL_KEYS, metrics=METRICS):
+        """Summarize rows into cells; non-finite values (e.g. infinite prices) are not counted."""
+        keys = [k for k in keys if k in df.columns]
+        values = df[list(metrics)].astype(float)
+        values = values.where(np.isfinite(values))
+        grouped = pd.concat([df[keys].astype(str), values], axis=1).groupby(keys, sort=True)
+        parts = {}
+        for metric in metrics:
+            g = grouped[metric]
+            n = g.count()
+            parts[_col(metric, 'n')] = n.astype(np.int64)
+            parts[_col(metric, 'sum')] = g.sum()
+            # pandas' grouped variance is a single-pass Welford update; M2 = n * population variance
+            parts[_col(metric, 'm2')] = (g.var(ddof=0) * n).fillna(0.0)
+            parts[_col(metric, 'min')] = g.min()
+            parts[_col(metric, 'max')] = g.max()
+        return cls(pd.DataFrame(parts).reset_index(), keys, metrics)
+
+    def select(self, filters=None, **equals):
+        """Cells matching a `query.Filters` and/or equality constraints on key columns.
+
+        Only cell-level predicates apply: clusters, outlier exclusion and
+        equality on key columns. Use `covers` to check whether a row-level
+        value range is also set. Cells of non-finite rows are always left
+        out, as the query backends leave out those rows.
+        """
+        cells = self.cells
+        mask = np.ones(len(cells), dtype=bool)
+        if FLAG_COLUMN in cells.columns:
+            mask &= (cells[FLAG_COLUMN] != FLAG_NON_FINITE).to_numpy()
+        if filters is not None:
+            if filters.clusters is not None:
+                mask &= cells['Cluster'].isin(filters.clusters).to_numpy()
+            if filters.exclude_outliers and FLAG_COLUMN in cells.columns:
+                mask &= (~cells[FLAG_COLUMN].isin(OUTLIER_FLAGS)).to_numpy()
+            equals = {**dict(filters.equals), **equals}
+        for column, value in equals.items():
+            mask &= (cells[column] == str(value)).to_numpy()
+        return MomentTable(cells[mask], self.keys, self.metrics)
+
+    @staticmethod
+    def covers(filters):
+        """True if every predicate in `filters` can be answered from cells."""
+        return filters.value_range is None
+
+    def merge(self, by=()):
+        """Merged moments per `by` group (one row for the whole table if `by` is empty)."""
+        by = [by] if isinstance(by, str) else list(by)
+        cells = self.cells
+        groups = [cells[k] for k in by] if by else np.zeros(len(cells), dtype=int)
+        out = {}
+        for metric in self.metrics:
+            n, total, m2 = (cells[_col(metric, s)].astype(float) for s in ('n', 'sum', 'm2'))
+            group_n = n.groupby(groups).transform('sum')
+            group_mean = total.groupby(groups).transform('sum') / group_n
+            cell_mean = total / n
+            # Chan's update summed over all cells in a group: sum of n_i * (mean_i - mean)^2
+            between = (n * (cell_mean - group_mean) ** 2).where(n > 0, 0.0)
+            out[_col(metric, 'n')] = n.groupby(groups).sum().astype(np.int64)
+            out[_col(metric, 'sum')] = total.groupby(groups).sum()
+            out[_col(metric, 'm2')] = m2.groupby(groups).sum() + between.groupby(groups).sum()
+            out[_col(metric, 'min')] = cells[_col(metric, 'min')].groupby(groups).min()
+            out[_col(metric, 'max')] = cells[_col(metric, 'max')].groupby(groups).max()
+        merged = pd.DataFrame(out)
+        if not by:
+            merged.index = ['All']
+        return merged
+
+    def profile(self, by='Cluster', metrics=None):
+        """Count, total, mean, std (sample), min and max per group, one column pair per metric."""
+        merged = self.merge(by)
+        metrics = metrics or self.metrics
+        columns = {}
+        for metric in metrics:
+            n = merged[_col(metric, 'n')]
+            columns[(metric, 'count')] = n
+            columns[(metric, 'total')] = merged[_col(metric, 'sum')]
+            columns[(metric, 'mean')] = merged[_col(metric, 'sum')] / n.where(n > 0)
+            columns[(metric, 'std')] = np.sqrt(merged[_col(metric, 'm2')] / (n - 1).where(n > 1))
+            columns[(metric, 'min')] = merged[_col(metric, 'min')]
+            columns[(metric, 'max')] = merged[_col(metric, 'max')]
+        return pd.DataFrame(columns)
+
+    def combine(self, other):
+        """Fold another table (e.g. a newly ingested partition) into this one, cell by cell."""
+        stacked = MomentTable(pd.concat([self.cells, other.cells], ignore_index=True), self.keys, self.metrics)
+        return MomentTable(stacked.merge(list(self.keys)).reset_index(), self.keys, self.metrics)
+
+    def save(self, path=MOMENTS_PATH):
+        arrays = {f"key:{k}": self.cells[k].to_numpy(dtype=str) for k in self.keys}
+        arrays.update({c: self.cells[c].to_numpy() for c in self.cells.columns if c not in self.keys})
+        np.savez_compressed(path, **arrays)
+
+    @classmethod
+    def load(cls, path=MOMENTS_PATH):
+        with np.load(path) as npz:
+            keys = [name[4:] for name in npz.files if name.startswith("key:")]
+            cells = pd.DataFrame({name[4:] if name.startswith("key:") else name: npz[name] for name in npz.files})
+        metrics = list(dict.fromkeys(c.split(':')[0] for c in cells.columns if c not in keys))
+        return cls(cells, keys, metrics)
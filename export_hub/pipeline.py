@@ -0,0 +1,362 @@
+"""Cached pipeline that rebuilds the app's input files.
+
+Replaces the manual top-to-bottom run of `notebooks/Export Data.ipynb` with
+explicit stages:
+
+    raw -> clean -> features -> cluster (+ PCA) -> sankey --> store
+               \\-> commodity_summary -> risk, gems --------------/
+    yearly sources -> forecast (per-series trend models)
+
+Every stage result is cached under a key made from the stage's code (including
+the helpers listed in its `code_deps`), its parameters and the content hashes
+of its inputs, so only stale stages rerun.
+Partitioned stages (clean, commodity_summary) are cached per commodity, so a
+one-row change only recomputes the partition it touched, and a stage whose
+output hash did not change leaves everything downstream cached. Stages whose
+inputs are ready run concurrently in a thread pool.
+
+Usage:
+    python -m export_hub.pipeline [--force] [--jobs N]
+"""
+import argparse
+import importlib.util
+import inspect
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+from sklearn.cluster import KMeans
+from sklearn.preprocessing import StandardScaler
+
+from export_hub.anomalies import flag_price_anomalies, quarantine_non_finite
+from export_hub.data import DATA_DIR, ROOT_DIR, YEARLY_SOURCES, clean_exports, load_yearly_exports, read_raw
+from export_hub.drift import BASELINE_PATH, DriftBaseline
+from export_hub.forecasting import MODELS_PATH, ForecastTable, _fit_chunk, fit_series_models
+from export_hub.hashing import content_hash, file_hash, sha
+from export_hub.moments import MOMENTS_PATH, MomentTable
+from export_hub.projection import PROJECTION_PATH, add_projection, fit_projection, normalize_names, project, save_bundle
+from export_hub.query import PARQUET_PATH, prepare_frame, write_parquet
+
+CACHE_DIR = ROOT_DIR / ".pipeline_cache"
+
+CLUSTER_FEATURES = ['VALUE_USD_MILLION', 'QUANTITY_KGS', 'PRICE_PER_KG']
+CLUSTER_LABELS = {
+    0: 'Low Value - High Volume',
+    1: 'High Price - Low Volume',
+    2: 'Mid Value - Mid Volume',
+    3: 'High Value - Moderate Volume',
+}
+
+
+# --- STAGE DEFINITION ---
+@dataclass
+class Stage:
+    name: str
+    func: Callable
+    deps: tuple = ()
+    params: dict = field(default_factory=dict)
+    files: tuple = ()                     # source files whose bytes are part of the key
+    targets: tuple = ()                   # files the stage writes; missing targets make it stale
+    partition_by: Optional[str] = None    # split the first dependency on this column
+    combine: Optional[Callable] = None    # merges partition results (default: concat)
+    code_deps: tuple = ()                 # helpers the stage calls; editing one makes the stage stale
+
+    def code_hash(self):
+        funcs = [self.func] + ([self.combine] if self.combine else []) + list(self.code_deps)
+        return sha(*(inspect.getsource(f) for f in funcs))
+
+
+# --- STAGE FUNCTIONS ---
+def read_source(path):
+    return read_raw(path)
+
+
+def clean(raw):
+    return clean_exports(raw)
+
+
+def build_features(clean_df, features=CLUSTER_FEATURES):
+    frame = clean_df[clean_df['QUANTITY_KGS'] > 0].reset_index(drop=True)
+    scaler = StandardScaler()
+    scaled = scaler.fit_transform(frame[list(features)])
+    return {'frame': frame, 'scaled': scaled, 'scaler': scaler}
+
+
+def cluster(features, n_clusters=4, random_state=42, n_components=3, incremental_pca=True, labels=CLUSTER_LABELS):
+    frame = features['frame'].copy()
+    kmeans = KMeans(n_clusters=n_clusters, random_state=random_state, n_init=10)
+    frame['Cluster'] = kmeans.fit_predict(features['scaled'])
+
+    # Projected once here; the app only reads the stored float32 coordinates
+    pca = fit_projection(features['scaled'], n_components=n_components, incremental=incremental_pca)
+    frame = add_projection(frame, project(pca, features['scaled']))
+
+    frame['Cluster_Label'] = frame['Cluster'].map({int(k): v for k, v in labels.items()})
+    return {'frame': frame, 'scaler': features['scaler'], 'kmeans': kmeans, 'pca': pca}
+
+
+def forecast(out_dir=str(DATA_DIR), n_jobs=1):
+    """Refit the per-series trends on every yearly source and write the model table."""
+    # Serial: this stage also runs inside the dashboard's background jobs, and the fit takes milliseconds
+    table = fit_series_models(load_yearly_exports(), n_jobs=n_jobs)
+    replace_files(out_dir, {MODELS_PATH.name: table.save})
+    return table
+
+
+def summarize_commodity(part):
+    """Per-commodity totals, reach and top market for one commodity partition.
+
+    The average price only covers rows with a finite, non-zero price; a
+    commodity without any such row gets 0.
+    """
+    by_country = part.groupby('COUNTRY')['VALUE_USD_MILLION'].sum()
+    # Zero-quantity rows have an infinite price and rows rounded to zero value a zero one
+    finite, _ = quarantine_non_finite(part, 'PRICE_PER_KG')
+    priced = finite.loc[finite['PRICE_PER_KG'] > 0, 'PRICE_PER_KG']
+    return pd.DataFrame({
+        'COMMODITY_NAME': [part['COMMODITY_NAME'].iloc[0]],
+        'TOTAL_COMMODITY_VALUE': [part['VALUE_USD_MILLION'].sum()],
+        'AVERAGE_PRICE_PER_KG': [priced.mean() if len(priced) else 0.0],
+        'DIVERSIFICATION_SCORE': [part['COUNTRY'].nunique()],
+        'TOP_MARKET': [by_country.idxmax()],
+        'TOP_MARKET_VALUE': [by_country.max()],
+    })
+
+
+def market_risk(summary):
+    risk = summary.drop(columns='AVERAGE_PRICE_PER_KG')
+    # Commodities with no export value have no concentration to speak of
+    total = risk['TOTAL_COMMODITY_VALUE']
+    risk['CONCENTRATION_RISK_%'] = (risk['TOP_MARKET_VALUE'] / total.where(total > 0) * 100).fillna(0.0)
+    return risk.sort_values('DIVERSIFICATION_SCORE', ascending=False, kind='stable').reset_index(drop=True)
+
+
+def hidden_gems(summary, value_quantile=0.5, price_quantile=0.75):
+    """Commodities with below-median total value but a top-quartile price per kg."""
+    summary, _ = quarantine_non_finite(summary, 'AVERAGE_PRICE_PER_KG')
+    value, price = summary['TOTAL_COMMODITY_VALUE'], summary['AVERAGE_PRICE_PER_KG']
+    gems = summary[(value < value.quantile(value_quantile)) & (price > price.quantile(price_quantile))]
+    gems = gems.rename(columns={'TOTAL_COMMODITY_VALUE': 'TOTAL_VALUE_USD_MILLION'})
+    gems = gems[['COMMODITY_NAME', 'TOTAL_VALUE_USD_MILLION', 'AVERAGE_PRICE_PER_KG']]
+    return gems.sort_values('AVERAGE_PRICE_PER_KG', ascending=False).reset_index(drop=True)
+
+
+def sankey_flows(clustered, top_commodities=5, top_countries=3):
+    """Cluster -> top commodities -> top destination countries link table."""
+    frame = clustered['frame'].assign(Cluster=lambda d: 'Cluster ' + d['Cluster'].astype(str))
+    by_cluster = frame.groupby(['Cluster', 'COMMODITY_NAME'])['VALUE_USD_MILLION'].sum()
+    first = (
+        by_cluster.sort_values(ascending=False, kind='stable')
+        .groupby(level=0, sort=True).head(top_commodities)
+        .sort_index(level=0, sort_remaining=False).reset_index()
+    )
+    by_country = (
+        frame[frame['COMMODITY_NAME'].isin(first['COMMODITY_NAME'])]
+        .groupby(['COMMODITY_NAME', 'COUNTRY'])['VALUE_USD_MILLION'].sum()
+    )
+    second = (
+        by_country.sort_values(ascending=False, kind='stable')
+        .groupby(level=0, sort=True).head(top_countries)
+        .sort_index(level=0, sort_remaining=False).reset_index()
+    )
+    columns = {'VALUE_USD_MILLION': 'value'}
+    return pd.concat([
+        first.rename(columns={'Cluster': 'source', 'COMMODITY_NAME': 'target', **columns}),
+        second.rename(columns={'COMMODITY_NAME': 'source', 'COUNTRY': 'target', **columns}),
+    ], ignore_index=True)
+
+
+def replace_files(out_dir, writers):
+    """Write files under temporary names next to their targets, then move them all into place.
+
+    `writers` maps file names to callables that write to the path they are
+    given. The app keys its caches on these files' modification times, so a
+    rerun during a rebuild sees the old files or the new ones, never a
+    partly written file.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    staged = []
+    try:
+        for name, write in writers.items():
+            path = out_dir / name
+            # Same directory, so os.replace is an atomic rename; the suffix is kept for writers that infer the format
+            tmp = path.with_name(f".{path.stem}.tmp-{os.getpid()}{path.suffix}")
+            staged.append((tmp, path))
+            write(tmp)
+        for tmp, path in staged:
+            os.replace(tmp, path)
+    except BaseException:
+        for tmp, _ in staged:
+            tmp.unlink(missing_ok=True)
+        raise
+    return [path for _, path in staged]
+
+
+def write_app_store(clean_df, clustered, risk, gems, sankey, out_dir=DATA_DIR):
+    out_dir = Path(out_dir)
+    prepared = prepare_frame(clustered['frame'])
+    bundle = {'scaler': clustered['scaler'], 'pca': clustered['pca'], 'features': CLUSTER_FEATURES,
+              'commodities': sorted(set(normalize_names(clustered['frame']['COMMODITY_NAME'])))}
+    writers = {
+        "Cleaned_Principal_Commodity_Exports.xlsx": lambda p: clean_df.to_excel(p, index=False, engine='openpyxl'),
+        "Cleaned_Principal_Commodity_Exports_with_clusters.xlsx":
+            lambda p: clustered['frame'].to_excel(p, index=False, engine='openpyxl'),
+        "market_risk_and_diversification.csv": lambda p: risk.to_csv(p, index=False),
+        "hidden_gems.csv": lambda p: gems.to_csv(p, index=False),
+        "sankey_data.csv": lambda p: sankey.to_csv(p, index=False),
+        PROJECTION_PATH.name: lambda p: save_bundle(bundle, p),
+        BASELINE_PATH.name: lambda p: DriftBaseline.from_clustered(clustered['frame']).save(p),
+        MOMENTS_PATH.name: lambda p: MomentTable.from_frame(prepared).save(p),
+    }
+    # pyarrow is optional; only the DuckDB query backend reads the Parquet store
+    if importlib.util.find_spec('pyarrow'):
+        writers[PARQUET_PATH.name] = lambda p: write_parquet(prepared, p)
+    replace_files(out_dir, writers)
+    return sorted(str(p) for p in out_dir.glob("*") if p.is_file())
+
+
+def default_stages(source=YEARLY_SOURCES[2022], out_dir=DATA_DIR):
+    """The app-store build as a list of stages."""
+    out_dir = Path(out_dir)
+    # The Parquet copy is only written (and so only expected) when pyarrow is installed
+    parquet = (PARQUET_PATH.name,) if importlib.util.find_spec('pyarrow') else ()
+    return [
+        Stage('raw', read_source, params={'path': str(source)}, files=(source,), code_deps=(read_raw,)),
+        Stage('clean', clean, deps=('raw',), partition_by='PRINCIPLE COMMODITY', code_deps=(clean_exports,)),
+        Stage('features', build_features, deps=('clean',)),
+        Stage('cluster', cluster, deps=('features',), params={'n_clusters': 4, 'random_state': 42},
+              code_deps=(fit_projection, project, add_projection)),
+        Stage('commodity_summary', summarize_commodity, deps=('clean',), partition_by='COMMODITY_NAME',
+              code_deps=(quarantine_non_finite,)),
+        Stage('risk', market_risk, deps=('commodity_summary',)),
+        Stage('gems', hidden_gems, deps=('commodity_summary',), code_deps=(quarantine_non_finite,)),
+        Stage('sankey', sankey_flows, deps=('cluster',)),
+        Stage('forecast', forecast, params={'out_dir': str(out_dir)}, files=tuple(YEARLY_SOURCES.values()),
+              targets=(out_dir / MODELS_PATH.name,),
+              code_deps=(load_yearly_exports, read_raw, clean_exports, fit_series_models, _fit_chunk, ForecastTable.save,
+                         replace_files)),
+        Stage(
+            'store', write_app_store,
+            deps=('clean', 'cluster', 'risk', 'gems', 'sankey'),
+            params={'out_dir': str(out_dir)},
+            code_deps=(replace_files, normalize_names, save_bundle, DriftBaseline.from_clustered, DriftBaseline.save,
+                       prepare_frame, flag_price_anomalies, MomentTable.from_frame, MomentTable.save, write_parquet),
+            targets=tuple(out_dir / name for name in (
+                "Cleaned_Principal_Commodity_Exports.xlsx",
+                "Cleaned_Principal_Commodity_Exports_with_clusters.xlsx",
+                "market_risk_and_diversification.csv",
+                "hidden_gems.csv",
+                "sankey_data.csv",
+                PROJECTION_PATH.name,
+                MOMENTS_PATH.name,
+                BASELINE_PATH.name,
+            ) + parquet),
+        ),
+    ]
+
+
+# --- RUNNER ---
+class Pipeline:
+    """Runs stages in dependency order, reusing cached results where inputs are unchanged."""
+
+    def __init__(self, stages, cache_dir=CACHE_DIR, max_workers=4):
+        self.stages = {s.name: s for s in stages}
+        self.cache_dir = Path(cache_dir)
+        self.max_workers = max_workers
+        for s in stages:
+            missing = [d for d in s.deps if d not in self.stages]
+            if missing:
+                raise ValueError(f"Stage '{s.name}' depends on unknown stage(s): {missing}")
+
+    def _cache_path(self, stage, key):
+        return self.cache_dir / stage.name / f"{key}.pkl"
+
+    def _cached_call(self, stage, key, compute, force):
+        path = self._cache_path(stage, key)
+        if path.exists() and not force:
+            return pd.read_pickle(path), True
+        result = compute()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        pd.to_pickle(result, tmp)
+        tmp.replace(path)
+        return result, False
+
+    def _run_stage(self, stage, inputs, force):
+        """Run one stage; `inputs` is a list of (output, output_hash) for its deps."""
+        # A partitioned input is keyed per partition below, not as a whole.
+        keyed_inputs = inputs[1:] if stage.partition_by else inputs
+        key = sha(
+            stage.name, stage.code_hash(), json.dumps(stage.params, sort_keys=True, default=str),
+            *(h for _, h in keyed_inputs), *(file_hash(f) for f in stage.files),
+        )
+        force = force or any(not Path(t).exists() for t in stage.targets)
+        args = [out for out, _ in inputs]
+
+        if stage.partition_by is None:
+            result, hit = self._cached_call(stage, key, lambda: stage.func(*args, **stage.params), force)
+            status = "cached" if hit else "ran"
+        else:
+            head, rest = args[0], args[1:]
+            parts, misses = [], 0
+            groups = head.groupby(stage.partition_by, sort=False)
+            for _, part in groups:
+                part_key = sha(key, content_hash(part))
+                out, hit = self._cached_call(
+                    stage, part_key, lambda p=part: stage.func(p, *rest, **stage.params), force
+                )
+                parts.append(out)
+                misses += not hit
+            combine = stage.combine or (lambda results: pd.concat(results, ignore_index=True))
+            result = combine(parts)
+            status = "cached" if misses == 0 else f"ran {misses}/{groups.ngroups} partitions"
+        return result, content_hash(result), status
+
+    def run(self, force=False, log=print):
+        """Run every stale stage and return {stage name: output}."""
+        done, pending, running = {}, dict(self.stages), {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pending or running:
+                for name, stage in list(pending.items()):
+                    if all(d in done for d in stage.deps):
+                        inputs = [done[d] for d in stage.deps]
+                        running[pool.submit(self._timed, stage, inputs, force)] = name
+                        del pending[name]
+                if not running:
+                    raise ValueError(f"Dependency cycle between stages: {sorted(pending)}")
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    result, out_hash, status, seconds = future.result()
+                    done[name] = (result, out_hash)
+                    log(f"[{name}] {status} ({seconds:.2f}s)")
+        return {name: result for name, (result, _) in done.items()}
+
+    def _timed(self, stage, inputs, force):
+        start = time.perf_counter()
+        result, out_hash, status = self._run_stage(stage, inputs, force)
+        return result, out_hash, status, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the dashboard's data files from the raw export data.")
+    parser.add_argument("--source", default=str(YEARLY_SOURCES[2022]), help="Raw principal commodity export file.")
+    parser.add_argument("--out", default=str(DATA_DIR), help="Directory the app reads its data from.")
+    parser.add_argument("--cache", default=str(CACHE_DIR), help="Stage cache directory.")
+    parser.add_argument("--jobs", type=int, default=4, help="Maximum stages to run concurrently.")
+    parser.add_argument("--force", action="store_true", help="Ignore the cache and rerun every stage.")
+    args = parser.parse_args()
+
+    pipeline = Pipeline(default_stages(Path(args.source), Path(args.out)), cache_dir=args.cache, max_workers=args.jobs)
+    pipeline.run(force=args.force)
+
+
+if __name__ == "__main__":
+    main()
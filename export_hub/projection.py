@@ -0,0 +1,116 @@
+"""PCA projection of the clustering features, fitted once at ingest.
+
+The pipeline fits the projection and stores PCA1..PCA3 as float32 columns,
+so the dashboard only slices and plots them. The fitted scaler and
+IncrementalPCA are saved together as a bundle; when a new partition (month
+or year) arrives, `update_projection` folds it into the PCA with a partial
+fit instead of refitting on all history, and `reproject_store` brings the
+stored coordinates onto the updated components.
+
+    python -m export_hub.projection NEW_FILE     # partial-fit on a new period, save, re-project the store
+"""
+import argparse
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.decomposition import PCA, IncrementalPCA
+
+from export_hub.anomalies import FLAG_COLUMN, FLAG_NON_FINITE, OUTLIER_FLAGS, flag_price_anomalies
+from export_hub.data import DATA_DIR, clean_exports, read_raw
+
+PROJECTION_PATH = DATA_DIR / "projection_model.joblib"
+PCA_COLUMNS = ['PCA1', 'PCA2', 'PCA3']
+
+
+def fit_projection(scaled, n_components=3, incremental=True, batch_size=1000):
+    """Fit PCA (or IncrementalPCA, which supports later partial fits) on scaled features."""
+    if incremental:
+        model = IncrementalPCA(n_components=n_components, batch_size=max(batch_size, n_components))
+    else:
+        model = PCA(n_components=n_components)
+    return model.fit(scaled)
+
+
+def project(model, scaled):
+    """Project scaled features to float32 coordinates."""
+    return model.transform(scaled).astype(np.float32)
+
+
+def add_projection(frame, coords):
+    """Return `frame` with one float32 PCA column per component."""
+    frame = frame.copy()
+    for i in range(coords.shape[1]):
+        frame[PCA_COLUMNS[i] if i < len(PCA_COLUMNS) else f'PCA{i + 1}'] = coords[:, i].astype(np.float32)
+    return frame
+
+
+def normalize_names(names):
+    """Commodity names as stored in a bundle (the sources pad them with spaces)."""
+    return pd.Series(names, dtype=str).str.strip().str.upper()
+
+
+def update_projection(bundle, partition):
+    """Fold a new partition into the PCA with a partial fit.
+
+    The partition is scaled with the bundle's existing scaler, so old and new
+    rows share one scaling. Rows `flag_price_anomalies` marks as outliers,
+    zero or non-finite prices are left out, and so are commodities the
+    projection was not fitted on (the bundle's `commodities`, when present),
+    so a few extreme prices or a commodity priced per unit cannot swing the
+    components. Returns float32 coordinates for the rows that were folded in.
+    Rows stored earlier are brought onto the updated components with
+    `reproject_store`.
+    """
+    scaler, model, features = bundle['scaler'], bundle['pca'], list(bundle['features'])
+    if not hasattr(model, 'partial_fit'):
+        raise TypeError("Partial updates need an IncrementalPCA projection; refit with incremental=True.")
+    part = partition[np.isfinite(partition[features]).all(axis=1) & (partition['QUANTITY_KGS'] > 0)]
+    if bundle.get('commodities') is not None:
+        part = part[normalize_names(part['COMMODITY_NAME']).isin(bundle['commodities'])]
+    part = part[~flag_price_anomalies(part)[FLAG_COLUMN].isin(OUTLIER_FLAGS + (FLAG_NON_FINITE,))]
+    scaled = scaler.transform(part[features].astype(float))
+    model.partial_fit(scaled)
+    return project(model, scaled)
+
+
+def reproject_store(bundle, data_dir=DATA_DIR):
+    """Rewrite the stored PCA columns (and the Parquet copy, if any) with the bundle's components."""
+    # Imported here: the query module reads PCA_COLUMNS from this one
+    from export_hub.query import MAIN_FILE, PARQUET_PATH, prepare_frame, write_parquet
+
+    data_dir = Path(data_dir)
+    frame = pd.read_excel(data_dir / MAIN_FILE, engine='openpyxl')
+    scaled = bundle['scaler'].transform(frame[list(bundle['features'])].astype(float))
+    frame = add_projection(frame, project(bundle['pca'], scaled))
+    frame.to_excel(data_dir / MAIN_FILE, index=False, engine='openpyxl')
+    if (data_dir / PARQUET_PATH.name).exists():
+        write_parquet(prepare_frame(frame), data_dir / PARQUET_PATH.name)
+    return frame
+
+
+def save_bundle(bundle, path=PROJECTION_PATH):
+    joblib.dump(bundle, path)
+
+
+def load_bundle(path=PROJECTION_PATH):
+    return joblib.load(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fold a new period into the PCA projection and re-project the stored rows.")
+    parser.add_argument("source", help="Raw export file for the new period (CSV or Excel).")
+    parser.add_argument("--bundle", default=str(PROJECTION_PATH), help="Projection bundle (.joblib).")
+    parser.add_argument("--data", default=str(DATA_DIR), help="Directory holding the app's stored tables.")
+    args = parser.parse_args()
+
+    bundle = load_bundle(args.bundle)
+    coords = update_projection(bundle, clean_exports(read_raw(Path(args.source))))
+    save_bundle(bundle, args.bundle)
+    frame = reproject_store(bundle, args.data)
+    print(f"Folded {len(coords):,} rows into the projection; re-projected {len(frame):,} stored rows in {args.data}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,390 @@
+"""Query backends for the dashboard's filter, group-by and top-N operations.
+
+The app talks to a `QueryBackend` instead of slicing one in-memory frame:
+
+* `PandasBackend` runs on a fully loaded DataFrame (the original behaviour).
+* `DuckDBBackend` runs on Parquet files with an embedded DuckDB engine. The
+  sidebar's cluster, value-range and outlier predicates are pushed into the
+  Parquet scan, and DuckDB scans row groups in parallel. Only aggregates, or
+  the filtered rows a view actually needs, are ever materialized.
+
+Both backends return the same shapes. Group sums are ordered by key, and
+top-N results are ordered by value descending with ties broken by key, so
+the results are identical up to floating-point summation order.
+
+Either backend can be wrapped in a `CachedBackend`, which keeps aggregate
+results per filter state so repeated views (and the server warm-up, see
+`export_hub.warmup`) skip the query entirely.
+
+Select the backend with `EXPORT_HUB_BACKEND=duckdb` (pandas is the
+default). Build the Parquet store with:
+
+    python -m export_hub.query --export
+"""
+import argparse
+import copy
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from export_hub.anomalies import FLAG_CATEGORIES, FLAG_COLUMN, FLAG_NON_FINITE, OUTLIER_FLAGS, flag_price_anomalies
+from export_hub.data import DATA_DIR
+from export_hub.projection import PCA_COLUMNS
+
+MAIN_FILE = "Cleaned_Principal_Commodity_Exports_with_clusters.xlsx"
+PARQUET_PATH = DATA_DIR / "exports.parquet"
+VALUE = 'VALUE_USD_MILLION'
+BACKEND_ENV = "EXPORT_HUB_BACKEND"
+
+
+def prepare_frame(df):
+    """The dashboard's view of the main table: cluster labels, float32 PCA and price flags."""
+    df = df.copy()
+    df['Cluster'] = 'Cluster ' + df['Cluster'].astype(str)
+    pca_cols = [c for c in PCA_COLUMNS if c in df.columns]
+    df[pca_cols] = df[pca_cols].astype('float32')
+    # Flagged once here so queries only filter on the stored flags
+    return flag_price_anomalies(df)
+
+
+def load_main_frame(data_dir=DATA_DIR):
+    return prepare_frame(pd.read_excel(Path(data_dir) / MAIN_FILE, engine='openpyxl'))
+
+
+def write_parquet(df, path=PARQUET_PATH, row_group_size=100_000):
+    """Write a prepared frame as Parquet; row groups are DuckDB's unit of parallel scanning."""
+    df.to_parquet(path, index=False, row_group_size=row_group_size)
+
+
+@dataclass(frozen=True)
+class Filters:
+    """The sidebar's global filters plus optional equality constraints (column -> value)."""
+    clusters: Optional[tuple] = None
+    value_range: Optional[tuple] = None
+    exclude_outliers: bool = False
+    equals: tuple = field(default=())
+
+    def where(self, **equals):
+        return replace(self, equals=self.equals + tuple(equals.items()))
+
+
+class SortedIndex:
+    """Row positions of a column grouped by value, for equality lookups without a full scan.
+
+    `keys` are the sorted distinct values, `order` the row positions sorted by
+    key, and rows with `keys[i]` are `order[offsets[i]:offsets[i + 1]]`.
+    """
+
+    def __init__(self, keys, order, offsets):
+        self.keys = keys
+        self.order = order
+        self.offsets = offsets
+
+    @classmethod
+    def from_codes(cls, codes, keys):
+        """Index over dictionary codes into sorted `keys` (-1 for missing values)."""
+        order = np.argsort(codes, kind='stable')
+        offsets = np.searchsorted(codes[order], np.arange(len(keys) + 1))
+        return cls(np.asarray(keys), order, offsets)
+
+    @classmethod
+    def from_values(cls, values):
+        codes, keys = pd.factorize(pd.Series(values), sort=True)
+        return cls.from_codes(codes, keys.to_numpy())
+
+    def rows(self, value):
+        i = int(np.searchsorted(self.keys, value))
+        if i < len(self.keys) and self.keys[i] == value:
+            return self.order[self.offsets[i]:self.offsets[i + 1]]
+        return self.order[:0]
+
+    def mask(self, value, n):
+        mask = np.zeros(n, dtype=bool)
+        mask[self.rows(value)] = True
+        return mask
+
+
+class QueryBackend:
+    """Filter, group-by and top-N over the main exports table.
+
+    `columns` lists the table's column names.
+    """
+    columns = []
+
+    def frame(self, filters, columns=None, limit=None):
+        """Materialize the filtered rows (all columns unless `columns` is given, at most `limit`)."""
+        raise NotImplementedError
+
+    def distinct(self, column, filters=None):
+        """Sorted unique values of `column`."""
+        raise NotImplementedError
+
+    def bounds(self, column):
+        """(min, max) of `column` over the unfiltered table."""
+        raise NotImplementedError
+
+    def group_sum(self, filters, by, value=VALUE):
+        """Sum of `value` per `by` key (a column or list of columns), ordered by key."""
+        raise NotImplementedError
+
+    def top_n(self, filters, by, n, value=VALUE):
+        """The `n` largest `value` sums per `by` key, largest first (ties by key)."""
+        raise NotImplementedError
+
+    def summary(self, filters):
+        """Totals and distinct counts for the overview's key metrics."""
+        raise NotImplementedError
+
+
+class PandasBackend(QueryBackend):
+    """Eager pandas operations on a fully loaded frame.
+
+    `indexes` maps column names to `SortedIndex`es over the frame's rows;
+    equality constraints on those columns use them instead of comparing
+    every row.
+    """
+
+    def __init__(self, df, indexes=None):
+        self.df = df
+        self.columns = list(df.columns)
+        self.indexes = indexes or {}
+
+    def _mask(self, filters):
+        df = self.df
+        mask = pd.Series(True, index=df.index)
+        if filters.clusters is not None:
+            mask &= df['Cluster'].isin(filters.clusters)
+        if filters.value_range is not None:
+            mask &= df[VALUE].between(*filters.value_range)
+        if FLAG_COLUMN in df.columns:
+            mask &= df[FLAG_COLUMN] != FLAG_NON_FINITE
+            if filters.exclude_outliers:
+                mask &= ~df[FLAG_COLUMN].isin(OUTLIER_FLAGS)
+        for column, value in filters.equals:
+            index = self.indexes.get(column)
+            mask &= (df[column] == value) if index is None else index.mask(value, len(df))
+        return mask
+
+    def frame(self, filters, columns=None, limit=None):
+        out = self.df[self._mask(filters)]
+        out = out[list(columns)] if columns is not None else out
+        return out.head(limit) if limit is not None else out
+
+    def distinct(self, column, filters=None):
+        values = self.df[column] if filters is None else self.df.loc[self._mask(filters), column]
+        return sorted(values.dropna().unique())
+
+    def bounds(self, column):
+        return float(self.df[column].min()), float(self.df[column].max())
+
+    def group_sum(self, filters, by, value=VALUE):
+        keys = [by] if isinstance(by, str) else list(by)
+        frame = self.frame(filters, keys + [value])
+        return frame.groupby(by, observed=True)[value].sum().sort_index().astype(float)
+
+    def top_n(self, filters, by, n, value=VALUE):
+        sums = self.group_sum(filters, by, value)
+        # Stable sort on the key-ordered sums breaks ties by key, as DuckDB's ORDER BY does
+        return sums.sort_values(ascending=False, kind='stable').head(n)
+
+    def summary(self, filters):
+        frame = self.frame(filters, [VALUE, 'QUANTITY_KGS', 'COMMODITY_NAME', 'COUNTRY'])
+        return {
+            'value': float(frame[VALUE].sum()),
+            'quantity': float(frame['QUANTITY_KGS'].sum()),
+            'commodities': int(frame['COMMODITY_NAME'].nunique()),
+            'countries': int(frame['COUNTRY'].nunique()),
+            'rows': len(frame),
+        }
+
+
+class DuckDBBackend(QueryBackend):
+    """DuckDB over Parquet: predicates are pushed into the scan, which runs on `threads` threads."""
+
+    def __init__(self, paths=PARQUET_PATH, threads=None, memory_limit=None):
+        import duckdb
+        import pyarrow.parquet as pq
+
+        paths = [paths] if isinstance(paths, (str, Path)) else list(paths)
+        self.paths = [str(p) for p in paths]
+        self.con = duckdb.connect()
+        self.con.execute(f"SET threads = {int(threads or os.cpu_count())}")
+        if memory_limit:
+            # Larger-than-memory aggregates spill to disk past this limit
+            self.con.execute(f"SET memory_limit = '{memory_limit}'")
+        self.columns = [row[0] for row in self._query(f"DESCRIBE SELECT * FROM {self._source()}").fetchall()]
+        # DuckDB picks its own pandas dtypes; `frame` restores the ones the Parquet was written from
+        self.dtypes = pq.read_schema(self.paths[0]).empty_table().to_pandas().dtypes.to_dict()
+        if FLAG_COLUMN in self.dtypes:
+            self.dtypes[FLAG_COLUMN] = pd.CategoricalDtype(FLAG_CATEGORIES)
+
+    def _source(self, row_numbers=False):
+        files = ", ".join("'" + p.replace("'", "''") + "'" for p in self.paths)
+        extra = ", filename=true, file_row_number=true" if row_numbers else ""
+        return f"read_parquet([{files}]{extra})"
+
+    def _query(self, sql, params=()):
+        # DuckDB connections are not safe to share between threads; each query gets a cursor
+        return self.con.cursor().execute(sql, list(params))
+
+    def _where(self, filters):
+        clauses, params = [], []
+        if filters is not None:
+            if filters.clusters is not None:
+                if not filters.clusters:
+                    clauses.append("FALSE")
+                else:
+                    clauses.append(f'"Cluster" IN ({", ".join("?" * len(filters.clusters))})')
+                    params += list(filters.clusters)
+            if filters.value_range is not None:
+                clauses.append(f'"{VALUE}" BETWEEN ? AND ?')
+                params += [float(filters.value_range[0]), float(filters.value_range[1])]
+            if FLAG_COLUMN in self.columns:
+                excluded = [FLAG_NON_FINITE] + (list(OUTLIER_FLAGS) if filters.exclude_outliers else [])
+                clauses.append(f'"{FLAG_COLUMN}" NOT IN ({", ".join("?" * len(excluded))})')
+                params += excluded
+            for column, value in filters.equals:
+                clauses.append(f'"{column}" = ?')
+                params.append(value.item() if isinstance(value, np.generic) else value)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def frame(self, filters, columns=None, limit=None):
+        select = "* EXCLUDE (filename, file_row_number)" if columns is None else ", ".join(f'"{c}"' for c in columns)
+        where, params = self._where(filters)
+        # Parquet files are scanned in parallel; ORDER BY file_row_number keeps the stored row order
+        sql = f"SELECT {select} FROM {self._source(row_numbers=True)}{where} ORDER BY filename, file_row_number"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        out = self._query(sql, params).df()
+        return out.astype({c: self.dtypes[c] for c in out.columns if c in self.dtypes})
+
+    def distinct(self, column, filters=None):
+        where, params = self._where(filters)
+        rows = self._query(
+            f'SELECT DISTINCT "{column}" FROM {self._source()}{where} ORDER BY 1', params
+        ).fetchall()
+        return [row[0] for row in rows if row[0] is not None]
+
+    def bounds(self, column):
+        low, high = self._query(f'SELECT min("{column}"), max("{column}") FROM {self._source()}').fetchone()
+        return float(low), float(high)
+
+    def _sums(self, filters, by, value, by_value=False, limit=None):
+        keys = [by] if isinstance(by, str) else list(by)
+        key_sql = ", ".join(f'"{k}"' for k in keys)
+        # Ties in value are broken by key, as in PandasBackend.top_n
+        order = f'"{value}" DESC, {key_sql}' if by_value else key_sql
+        where, params = self._where(filters)
+        sql = (f'SELECT {key_sql}, sum("{value}") AS "{value}" FROM {self._source()}{where} '
+               f'GROUP BY {key_sql} ORDER BY {order}')
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        out = self._query(sql, params).df()
+        return out.set_index(by)[value].astype(float)
+
+    def group_sum(self, filters, by, value=VALUE):
+        return self._sums(filters, by, value)
+
+    def top_n(self, filters, by, n, value=VALUE):
+        return self._sums(filters, by, value, by_value=True, limit=n)
+
+    def summary(self, filters):
+        where, params = self._where(filters)
+        value, quantity, commodities, countries, rows = self._query(
+            f'SELECT coalesce(sum("{VALUE}"), 0), coalesce(sum("QUANTITY_KGS"), 0), '
+            f'count(DISTINCT "COMMODITY_NAME"), count(DISTINCT "COUNTRY"), count(*) '
+            f'FROM {self._source()}{where}', params
+        ).fetchone()
+        return {'value': float(value), 'quantity': float(quantity), 'commodities': int(commodities),
+                'countries': int(countries), 'rows': int(rows)}
+
+
+class CachedBackend(QueryBackend):
+    """Memoizes another backend's aggregate queries per filter state.
+
+    Group sums, top-N lists, summaries, distinct values and bounds are small,
+    so they are kept in a bounded LRU cache shared by every session that uses
+    this backend; row-level `frame` queries are passed through. Callers get
+    copies, so cached results are never mutated.
+    """
+
+    def __init__(self, backend, maxsize=1024):
+        self.backend = backend
+        self.columns = backend.columns
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, method, *args):
+        key = (method,) + tuple(tuple(a) if isinstance(a, list) else a for a in args)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return copy.copy(self._cache[key])
+        # Computed outside the lock; two sessions racing on one key just compute it twice
+        result = getattr(self.backend, method)(*args)
+        with self._lock:
+            self._cache[key] = result
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return copy.copy(result)
+
+    def __len__(self):
+        return len(self._cache)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def frame(self, filters, columns=None, limit=None):
+        return self.backend.frame(filters, columns, limit)
+
+    def distinct(self, column, filters=None):
+        return self._cached('distinct', column, filters)
+
+    def bounds(self, column):
+        return self._cached('bounds', column)
+
+    def group_sum(self, filters, by, value=VALUE):
+        return self._cached('group_sum', filters, by, value)
+
+    def top_n(self, filters, by, n, value=VALUE):
+        return self._cached('top_n', filters, by, n, value)
+
+    def summary(self, filters):
+        return self._cached('summary', filters)
+
+
+def get_backend(name=None, df=None, paths=PARQUET_PATH):
+    """Backend named by `name` or $EXPORT_HUB_BACKEND (default "pandas")."""
+    name = (name or os.environ.get(BACKEND_ENV, "pandas")).lower()
+    if name == "duckdb":
+        return DuckDBBackend(paths)
+    if name == "pandas":
+        return PandasBackend(df if df is not None else load_main_frame())
+    raise ValueError(f"Unknown query backend {name!r}; expected 'pandas' or 'duckdb'.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the Parquet store used by the DuckDB query backend.")
+    parser.add_argument("--export", action="store_true", help="Write the app's main table to Parquet.")
+    parser.add_argument("--data", default=str(DATA_DIR), help="Directory the app reads its data from.")
+    parser.add_argument("--out", default=str(PARQUET_PATH), help="Parquet file to write.")
+    args = parser.parse_args()
+
+    if args.export:
+        df = load_main_frame(args.data)
+        write_parquet(df, args.out)
+        print(f"Wrote {len(df)} rows to {args.out}")
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,464 @@
+"""Headless batch reports: every analysis mode for a list of filter presets.
+
+Each preset is one set of sidebar filters (clusters, value range, outlier
+exclusion) plus the selections a person would otherwise click through
+(commodity, countries, scenario sliders). The data files are loaded once in
+the parent and handed to each worker process when it starts; inside a worker,
+filtered frames and treemap aggregates are cached per filter state, so presets
+that share filters reuse them. Modes that ignore the filters (Export Flow, Market
+Risk and Drift Alerts) are built once and shared by every preset.
+
+    python -m export_hub.reports --presets presets.json --out reports --jobs 8
+
+Output, viewable without a server:
+
+    reports/index.html            links to every report
+    reports/manifest.json         preset -> mode -> files
+    reports/plotly.min.js         written once, referenced by every page
+    reports/shared/<mode>.html|json
+    reports/<preset>/<mode>.html|json
+"""
+import argparse
+import html
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+from plotly.offline import get_plotlyjs
+from plotly.utils import PlotlyJSONEncoder
+
+from export_hub import figures
+from export_hub.data import DATA_DIR, ROOT_DIR
+from export_hub.drift import HISTORY_COLUMNS, HISTORY_PATH, load_history
+from export_hub.forecasting import ForecastTable
+from export_hub.hierarchy import HierarchyTree
+from export_hub.moments import MomentTable
+from export_hub.projection import PCA_COLUMNS
+from export_hub.query import Filters, PandasBackend, load_main_frame
+
+REPORTS_DIR = ROOT_DIR / "reports"
+SHARED_DIR = "shared"
+PLOTLY_JS = "plotly.min.js"
+# Modes whose content does not depend on the sidebar filters
+SHARED_MODES = ("🌊 Export Flow Analysis", "🌎 Market Risk & Diversification", "🚨 Drift Alerts")
+
+
+@dataclass
+class Preset:
+    """One report variant: sidebar filters plus per-mode selections."""
+    name: str
+    clusters: Optional[list] = None
+    value_range: Optional[tuple] = None
+    exclude_outliers: bool = False
+    commodity: Optional[str] = None
+    countries: Optional[list] = None
+    price_increase: float = 10
+    quantity_increase: float = 10
+    top_n: int = 10
+
+    def filters(self):
+        return Filters(
+            tuple(self.clusters) if self.clusters is not None else None,
+            tuple(self.value_range) if self.value_range is not None else None,
+            self.exclude_outliers,
+        )
+
+
+@dataclass
+class ModeReport:
+    mode: str
+    metrics: dict = field(default_factory=dict)
+    figures: list = field(default_factory=list)  # (title, plotly figure)
+    tables: list = field(default_factory=list)  # (title, DataFrame)
+    notes: list = field(default_factory=list)
+
+
+def load_presets(path):
+    with open(path) as f:
+        return [Preset(**entry) for entry in json.load(f)]
+
+
+def default_presets(df):
+    """All data, then one preset per cluster."""
+    presets = [Preset("all")]
+    for cluster in sorted(df["Cluster"].unique()):
+        presets.append(Preset(slugify(cluster), clusters=[cluster]))
+    return presets
+
+
+def load_report_data(data_dir=DATA_DIR):
+    """The same frames the dashboard loads, prepared the same way."""
+    df = load_main_frame(data_dir)
+    risk_df = pd.read_csv(Path(data_dir) / "market_risk_and_diversification.csv")
+    sankey_df = pd.read_csv(Path(data_dir) / "sankey_data.csv")
+    try:
+        drift_history = load_history(Path(data_dir) / HISTORY_PATH.name)
+    except FileNotFoundError:
+        drift_history = pd.DataFrame(columns=HISTORY_COLUMNS)
+    try:
+        forecast_models = ForecastTable.load()
+    except FileNotFoundError:
+        forecast_models = None
+    return df, risk_df, sankey_df, drift_history, forecast_models
+
+
+def slugify(text):
+    return re.sub(r"[^a-z0-9]+", "-", str(text).lower()).strip("-") or "report"
+
+
+# --- MODE BUILDERS ---
+# Headless equivalents of the app's page renderers; selections the app takes from
+# widgets come from the preset, falling back to the largest item by value.
+
+def _largest(frame, column, n=1):
+    return list(frame.groupby(column)["VALUE_USD_MILLION"].sum().nlargest(n).index)
+
+
+def _resolve(frame, column, name):
+    """The label in `column` matching `name`; commodity names in the data are space-padded."""
+    for label in frame[column].unique():
+        if str(label).strip() == str(name).strip():
+            return label
+    return None
+
+
+def _pick_commodity(frame, preset, report):
+    if preset.commodity is None:
+        return _largest(frame, "COMMODITY_NAME")[0]
+    commodity = _resolve(frame, "COMMODITY_NAME", preset.commodity)
+    if commodity is None:
+        report.notes.append(f"{preset.commodity} is not in the filtered data.")
+    return commodity
+
+
+def build_overview(frame, preset, ctx):
+    backend, filters = ctx["backend"], preset.filters()
+    report = ModeReport("📈 Dashboard Overview", metrics=figures.overview_metrics(backend.summary(filters)))
+    fig_map = figures.country_tier_map(backend.group_sum(filters, 'COUNTRY'))
+    if fig_map is not None:
+        report.figures.append(("Global Export Distribution by Value (USD Million)", fig_map))
+    else:
+        report.notes.append("Not enough data diversity to display a tiered world map.")
+    report.figures.append(("Top 15 Commodities by Export Value", figures.top_commodities_bar(backend.top_n(filters, 'COMMODITY_NAME', 15))))
+    report.figures.append(("Share of Value by Cluster", figures.cluster_share_pie(backend.group_sum(filters, 'Cluster'))))
+    return report
+
+
+def build_export_flow(sankey_df):
+    report = ModeReport("🌊 Export Flow Analysis")
+    if sankey_df.empty:
+        report.notes.append("Sankey diagram data not available.")
+    else:
+        report.figures.append(("Export Value Flow", figures.sankey_figure(sankey_df)))
+    return report
+
+
+def build_commodity_deep_dive(frame, preset, ctx):
+    report = ModeReport("🔬 Commodity Deep-Dive")
+    commodity = _pick_commodity(frame, preset, report)
+    if commodity is None:
+        return report
+    commodity_df = frame[frame["COMMODITY_NAME"] == commodity]
+    profile = None
+    if ctx["moments"].covers(preset.filters()):
+        profile = ctx["moments"].select(preset.filters(), COMMODITY_NAME=commodity).profile(())
+    report.metrics = {"Commodity": commodity.strip(), **figures.commodity_metrics(commodity_df, profile)}
+    report.figures.append(("Top 10 Destinations by Value", figures.top_destinations_bar(commodity_df)))
+    report.figures.append(("Price Distribution", figures.price_histogram(commodity_df)))
+    return report
+
+
+def build_geographic_comparison(frame, preset, ctx):
+    report = ModeReport("🌐 Geographic Comparison")
+    if preset.countries:
+        countries = [_resolve(frame, "COUNTRY", name) for name in preset.countries]
+        if None in countries:
+            report.notes.append(f"Not all of {', '.join(preset.countries)} are in the filtered data.")
+            return report
+    else:
+        countries = _largest(frame, "COUNTRY", 2)
+    if len(countries) < 2:
+        report.notes.append("Fewer than two countries in the filtered data.")
+        return report
+    country1, country2 = countries[:2]
+    report.metrics, fig = figures.country_comparison(frame, country1, country2)
+    if fig is not None:
+        report.figures.append((f"Top Shared Commodities Exported to {country1} and {country2}", fig))
+    else:
+        report.notes.append(f"No common commodities found between {country1} and {country2}.")
+    return report
+
+
+def build_cluster_explorer(frame, preset, ctx):
+    report = ModeReport("🧩 Cluster Explorer")
+    for view in figures.CLUSTER_VIEWS:
+        if view != "Log-Log Scatter" and not set(PCA_COLUMNS).issubset(frame.columns):
+            report.notes.append("PCA coordinates are missing. Run `python -m export_hub.pipeline` to compute them.")
+            break
+        report.figures.append((view, figures.cluster_scatter(frame, view)))
+    return report
+
+
+def build_cluster_profile(frame, preset, ctx):
+    report = ModeReport("📋 Cluster Profile")
+    filters = preset.filters()
+    if not ctx["moments"].covers(filters):
+        report.notes.append("Profiles come from per-cell summaries and cover the full value range.")
+    cells = ctx["moments"].select(filters)
+    report.metrics = figures.profile_metrics(cells.profile(()))
+    for by, label in (("Cluster", "Cluster"), ("COMMODITY_NAME", "Commodity")):
+        profile = cells.profile(by)
+        report.figures.append((f"Mean Price per Kg by {label}", figures.profile_bar(profile, 'PRICE_PER_KG')))
+        report.tables.append((f"Profile by {label}", figures.profile_table(profile).reset_index()))
+    return report
+
+
+def build_treemap(frame, preset, ctx):
+    report = ModeReport("🌳 Treemap Drill-Down")
+    tree = ctx["tree"]()
+    nodes = tree.view((), depth=2, top_n=preset.top_n)
+    report.figures.append(("Cluster → Commodity Treemap", figures.treemap_figure(nodes, "Treemap")))
+    # One level deeper so the static page still reaches individual countries
+    nodes = tree.view((), depth=3, top_n=preset.top_n)
+    report.figures.append(("Cluster → Commodity → Country Sunburst", figures.treemap_figure(nodes, "Sunburst")))
+    return report
+
+
+def build_what_if(frame, preset, ctx):
+    report = ModeReport("🎯 What-If Scenario Planner")
+    commodity = _pick_commodity(frame, preset, report)
+    if commodity is None:
+        return report
+    results = figures.scenario_results(frame, commodity, preset.price_increase, preset.quantity_increase)
+    report.metrics = {
+        "Commodity": commodity.strip(),
+        "Price Increase": f"{preset.price_increase}%",
+        "Quantity Increase": f"{preset.quantity_increase}%",
+        **figures.scenario_metrics(results),
+    }
+    report.figures.append(("Revenue Comparison", figures.revenue_comparison_bar(results['current'], results['new'])))
+
+    forecast_models = ctx["forecast_models"]
+    if forecast_models is not None:
+        projection = figures.trend_projection(forecast_models, commodity, results['countries'])
+        next_year = forecast_models.last_year + 1
+        report.metrics[f"Trend-Projected Revenue (FY {next_year}-{str(next_year + 1)[-2:]})"] = (
+            f"${projection['PROJECTED_VALUE_USD_MILLION'].sum():,.2f} M"
+        )
+        report.figures.append(("Top 10 Projected Markets", figures.projected_markets_bar(projection)))
+        report.tables.append(("Trend Projection by Market", projection))
+    else:
+        report.notes.append("Trend projections are unavailable. Run `python -m export_hub.forecasting` to fit the models.")
+    return report
+
+
+def build_market_risk(risk_df):
+    report = ModeReport("🌎 Market Risk & Diversification")
+    if risk_df.empty:
+        report.notes.append("Risk & Diversification data not available.")
+    else:
+        report.tables.append(("Top 15 Most Diversified Commodities", figures.most_diversified(risk_df)))
+        report.tables.append(("Top 15 Highest-Risk Commodities", figures.highest_risk(risk_df)))
+    return report
+
+
+def build_drift_alerts(drift_history):
+    report = ModeReport("🚨 Drift Alerts")
+    if drift_history.empty:
+        report.notes.append("No periods have been scored yet.")
+        return report
+    period = drift_history['PERIOD'].iloc[-1]
+    period_rows = drift_history[drift_history['PERIOD'] == period]
+    report.metrics = {"Period": period, **figures.drift_metrics(period_rows)}
+    report.tables.append(("Alerts", figures.drift_alerts_table(period_rows)))
+    matrix = figures.migration_matrix(period_rows)
+    if not matrix.empty:
+        report.tables.append(("Cluster Migrations (pairs)", matrix.reset_index()))
+    report.figures.append(("Share of Export Value by Cluster", figures.cluster_share_change(period_rows)))
+    report.figures.append(("Alerts per Period", figures.drift_alert_history(drift_history)))
+    return report
+
+
+FILTERED_BUILDERS = {
+    "📈 Dashboard Overview": build_overview,
+    "🔬 Commodity Deep-Dive": build_commodity_deep_dive,
+    "🌐 Geographic Comparison": build_geographic_comparison,
+    "🧩 Cluster Explorer": build_cluster_explorer,
+    "📋 Cluster Profile": build_cluster_profile,
+    "🌳 Treemap Drill-Down": build_treemap,
+    "🎯 What-If Scenario Planner": build_what_if,
+}
+
+
+# --- OUTPUT ---
+def write_report(report, out_dir, title, plotlyjs):
+    """Write one mode as a standalone HTML page and a JSON document; return their paths."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    slug = slugify(report.mode)
+    script = f'<script src="{plotlyjs}"></script>'
+
+    parts = [f"<h1>{html.escape(title)}</h1>", f"<h2>{html.escape(report.mode)}</h2>"]
+    if report.metrics:
+        parts.append("<table class='metrics'>" + "".join(
+            f"<tr><th>{html.escape(str(k))}</th><td>{html.escape(str(v))}</td></tr>" for k, v in report.metrics.items()
+        ) + "</table>")
+    parts += [f"<p class='note'>{html.escape(note)}</p>" for note in report.notes]
+    for fig_title, fig in report.figures:
+        parts.append(f"<h3>{html.escape(fig_title)}</h3>")
+        parts.append(fig.to_html(full_html=False, include_plotlyjs=False))
+    for table_title, table in report.tables:
+        parts.append(f"<h3>{html.escape(table_title)}</h3>")
+        parts.append(table.to_html(index=False, float_format=lambda v: f"{v:,.2f}", border=0))
+    page = (
+        f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{html.escape(title)} — {html.escape(report.mode)}</title>"
+        f"{script}<style>body{{font-family:sans-serif;margin:2em}}table{{border-collapse:collapse}}"
+        f"th,td{{padding:4px 10px;border-bottom:1px solid #ddd;text-align:left}}.note{{color:#a15c00}}</style>"
+        f"</head><body>{''.join(parts)}</body></html>"
+    )
+    html_path = out_dir / f"{slug}.html"
+    html_path.write_text(page, encoding="utf-8")
+
+    document = {
+        "title": title,
+        "mode": report.mode,
+        "metrics": report.metrics,
+        "notes": report.notes,
+        "tables": {name: table.to_dict(orient="records") for name, table in report.tables},
+        "figures": {name: fig.to_plotly_json() for name, fig in report.figures},
+    }
+    json_path = out_dir / f"{slug}.json"
+    json_path.write_text(json.dumps(document, cls=PlotlyJSONEncoder), encoding="utf-8")
+    return {"html": str(html_path), "json": str(json_path)}
+
+
+# --- WORKERS ---
+_shared = {}
+
+
+def _init_worker(df, moments, forecast_models, out_dir, plotlyjs):
+    # Runs once per process; every preset the worker builds reuses these
+    _shared.update(backend=PandasBackend(df), moments=moments, forecast_models=forecast_models, out_dir=Path(out_dir), plotlyjs=plotlyjs)
+    _filtered.cache_clear()
+    _tree.cache_clear()
+
+
+@lru_cache(maxsize=32)
+def _filtered(filters):
+    return _shared["backend"].frame(filters)
+
+
+@lru_cache(maxsize=32)
+def _tree(filters):
+    return HierarchyTree(_filtered(filters))
+
+
+def build_preset(preset, modes=None):
+    """Build and write every filter-dependent mode for one preset (runs in a worker)."""
+    start = time.perf_counter()
+    filters = preset.filters()
+    frame = _filtered(filters)
+    ctx = {
+        "backend": _shared["backend"], "moments": _shared["moments"],
+        "tree": lambda: _tree(filters), "forecast_models": _shared["forecast_models"],
+    }
+    out_dir = _shared["out_dir"] / slugify(preset.name)
+    title = f"Export Intelligence Report: {preset.name}"
+
+    files = {}
+    for mode, builder in FILTERED_BUILDERS.items():
+        if modes is not None and mode not in modes:
+            continue
+        if frame.empty:
+            report = ModeReport(mode, notes=["No data matches this preset's filters."])
+        else:
+            report = builder(frame, preset, ctx)
+        files[mode] = write_report(report, out_dir, title, f"../{_shared['plotlyjs']}")
+    return preset.name, files, time.perf_counter() - start
+
+
+def write_index(out_dir, manifest):
+    rows = []
+    for name, files in manifest.items():
+        links = " · ".join(
+            f"<a href='{Path(paths['html']).relative_to(out_dir)}'>{html.escape(mode)}</a>" for mode, paths in files.items()
+        )
+        rows.append(f"<li><b>{html.escape(name)}</b>: {links}</li>")
+    (out_dir / "index.html").write_text(
+        f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>Export Intelligence Reports</title></head>"
+        f"<body style='font-family:sans-serif'><h1>Export Intelligence Reports</h1><ul>{''.join(rows)}</ul></body></html>",
+        encoding="utf-8",
+    )
+    (out_dir / "manifest.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+
+
+def generate_reports(presets, out_dir=REPORTS_DIR, data_dir=DATA_DIR, jobs=None, modes=None, log=print,
+                     mp_context=None):
+    """Build every mode for every preset in a process pool; return the manifest.
+
+    `mp_context` is passed to the pool; callers running inside a threaded
+    server should pass a `spawn` context rather than fork it.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    (out_dir / PLOTLY_JS).write_text(get_plotlyjs(), encoding="utf-8")
+    df, risk_df, sankey_df, drift_history, forecast_models = load_report_data(data_dir)
+
+    manifest = {}
+    shared_title = "Export Intelligence Report: all presets"
+    shared = (build_export_flow, sankey_df), (build_market_risk, risk_df), (build_drift_alerts, drift_history)
+    for mode, (builder, data) in zip(SHARED_MODES, shared):
+        if modes is None or mode in modes:
+            manifest.setdefault(SHARED_DIR, {})[mode] = write_report(
+                builder(data), out_dir / SHARED_DIR, shared_title, f"../{PLOTLY_JS}"
+            )
+
+    jobs = jobs or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=mp_context, initializer=_init_worker,
+                             initargs=(df, MomentTable.from_frame(df), forecast_models, out_dir, PLOTLY_JS)) as pool:
+        futures = [pool.submit(build_preset, preset, modes) for preset in presets]
+        try:
+            for future in as_completed(futures):
+                name, files, elapsed = future.result()
+                manifest[name] = files
+                log(f"  {name}: {len(files)} modes in {elapsed:.1f}s")
+        except BaseException:
+            # Don't build the remaining presets if a preset failed or `log` raised (e.g. a cancelled job)
+            pool.shutdown(cancel_futures=True)
+            raise
+
+    write_index(out_dir, manifest)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render every analysis mode for a list of filter presets to HTML and JSON.")
+    parser.add_argument("--presets", help="JSON list of presets (fields of `Preset`). Defaults to all data plus one per cluster.")
+    parser.add_argument("--out", default=str(REPORTS_DIR), help="Output directory.")
+    parser.add_argument("--data", default=str(DATA_DIR), help="Directory the app reads its data from.")
+    parser.add_argument("--jobs", type=int, default=None, help="Worker processes (default: one per CPU).")
+    parser.add_argument("--modes", nargs="+", choices=figures.ANALYSIS_MODES, help="Only build these modes.")
+    args = parser.parse_args()
+
+    if args.presets:
+        presets = load_presets(args.presets)
+    else:
+        presets = default_presets(load_report_data(args.data)[0])
+    names = [slugify(p.name) for p in presets]
+    if len(set(names)) != len(names) or SHARED_DIR in names:
+        parser.error("Preset names must be unique (after slugifying) and must not be 'shared'.")
+
+    start = time.perf_counter()
+    manifest = generate_reports(presets, args.out, args.data, args.jobs, args.modes)
+    n_files = sum(len(files) for files in manifest.values())
+    print(f"Built {n_files} reports for {len(presets)} presets in {time.perf_counter() - start:.1f}s -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
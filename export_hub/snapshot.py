@@ -0,0 +1,259 @@
+"""Versioned on-disk snapshot of the dashboard's precomputed structures.
+
+Without it, every restarted process re-reads the Excel and CSV files,
+re-flags prices, and rebuilds the per-cell moments and the equality
+indexes. The snapshot stores all of these once as plain `.npy` arrays, and
+`open_snapshot` memory-maps them. A restarted or newly added replica maps the
+files and serves immediately. Pages are read from disk, or shared through
+the OS page cache, only when something touches them.
+
+Layout:
+
+    .snapshot/<key>/manifest.json    format version, source hashes, tables and indexes
+    .snapshot/<key>/<table>.<column>.<part>.npy
+
+Tables are stored column by column. Numeric columns are stored as they are.
+String columns are dictionary-encoded as the sorted distinct values plus
+int32 codes, so every array has a fixed-width dtype and can be mapped. The
+main table also gets a `query.SortedIndex` per lookup column, built from
+those codes.
+
+`<key>` is a hash of the format version, the code that prepares the tables,
+and the SHA-256 of every source file. When a data file changes (e.g. after
+a pipeline run), the key changes and a new snapshot is built on first use.
+Older snapshots are removed once the new one is in place. Each snapshot is
+written to a temporary directory and renamed into place, so replicas
+sharing the directory never see a partial one.
+
+    python -m export_hub.snapshot          # build (or verify) the snapshot for the current data files
+"""
+import argparse
+import inspect
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from export_hub.anomalies import flag_price_anomalies
+from export_hub.data import DATA_DIR, ROOT_DIR
+from export_hub.hashing import file_hash, sha
+from export_hub.moments import MOMENTS_PATH, MomentTable
+from export_hub.query import MAIN_FILE, SortedIndex, prepare_frame
+
+SNAPSHOT_DIR = ROOT_DIR / ".snapshot"
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+INDEX_COLUMNS = ('COMMODITY_NAME', 'COUNTRY', 'Cluster')
+
+# Table name -> source file in the data directory
+SOURCES = {
+    'main': MAIN_FILE,
+    'market_risk': "market_risk_and_diversification.csv",
+    'hidden_gems': "hidden_gems.csv",
+    'sankey': "sankey_data.csv",
+    'moments': MOMENTS_PATH.name,
+}
+
+
+def source_paths(data_dir=DATA_DIR):
+    return {name: Path(data_dir) / file for name, file in SOURCES.items()}
+
+
+def source_mtimes(data_dir=DATA_DIR):
+    """Cheap change detector for callers that cache an open snapshot."""
+    return tuple(p.stat().st_mtime_ns if p.exists() else None for p in source_paths(data_dir).values())
+
+
+def _code_hash():
+    # Changing how tables are prepared invalidates snapshots built by the old code
+    funcs = (prepare_frame, flag_price_anomalies, MomentTable.from_frame, _read_tables)
+    return sha(*(inspect.getsource(f) for f in funcs))
+
+
+def snapshot_key(data_dir=DATA_DIR):
+    """(key, sources) for the current data files; missing files are left out (and their tables with them)."""
+    sources = {
+        name: {"file": path.name, "sha256": file_hash(path), "bytes": path.stat().st_size}
+        for name, path in source_paths(data_dir).items() if path.exists()
+    }
+    key = sha(FORMAT_VERSION, _code_hash(), json.dumps(sources, sort_keys=True))
+    return f"v{FORMAT_VERSION}-{key[:16]}", sources
+
+
+def _read_tables(paths):
+    """The app's tables from the source files that exist, prepared as the app uses them."""
+    tables, meta = {}, {}
+    if paths['main'].exists():
+        tables['main'] = prepare_frame(pd.read_excel(paths['main'], engine='openpyxl'))
+    for name in ('market_risk', 'hidden_gems', 'sankey'):
+        if paths[name].exists():
+            tables[name] = pd.read_csv(paths[name])
+    if paths['moments'].exists():
+        moments = MomentTable.load(paths['moments'])
+    elif 'main' in tables:
+        moments = MomentTable.from_frame(tables['main'])
+    else:
+        moments = None
+    if moments is not None:
+        tables['moments'] = moments.cells
+        meta['moments'] = {"keys": list(moments.keys), "metrics": list(moments.metrics)}
+    return tables, meta
+
+
+# --- COLUMN ENCODING ---
+def _encode(frame, table, out_dir):
+    """Write one table's columns as .npy files; returns the column entries and each string column's codes."""
+    columns, codes_by_column = [], {}
+    for i, name in enumerate(frame.columns):
+        series = frame[name]
+        prefix = f"{table}.{i}"
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            kind, codes, values = 'category', series.cat.codes.to_numpy(), series.cat.categories.to_numpy()
+        elif series.dtype == object:
+            if pd.api.types.infer_dtype(series, skipna=True) not in ('string', 'empty'):
+                raise TypeError(f"Column {name!r} of {table!r} mixes types and cannot be snapshotted")
+            kind = 'string'
+            codes, values = pd.factorize(series, sort=True)
+        else:
+            kind, codes, values = 'array', None, series.to_numpy()
+        if codes is not None:
+            codes = codes.astype(np.int32)
+            values = np.asarray(values, dtype=str)
+            np.save(out_dir / f"{prefix}.codes.npy", codes)
+            codes_by_column[name] = (codes, values)
+        np.save(out_dir / f"{prefix}.values.npy", values, allow_pickle=False)
+        columns.append({"name": str(name), "kind": kind, "dtype": str(series.dtype)})
+    return columns, codes_by_column
+
+
+def build_snapshot(data_dir=DATA_DIR, snapshot_dir=SNAPSHOT_DIR):
+    """Build the snapshot for the current data files, replacing older ones."""
+    key, sources = snapshot_key(data_dir)
+    snapshot_dir = Path(snapshot_dir)
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+    tmp = snapshot_dir / f"{key}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir()
+    try:
+        _write(tmp, key, sources, *_read_tables(source_paths(data_dir)))
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+    final = snapshot_dir / key
+    try:
+        tmp.rename(final)
+    except OSError:
+        # Another process finished the same snapshot first; theirs is identical
+        shutil.rmtree(tmp, ignore_errors=True)
+    _prune(snapshot_dir, keep=key)
+    return Snapshot(final)
+
+
+def _write(out_dir, key, sources, tables, meta):
+    manifest = {"version": FORMAT_VERSION, "key": key, "created": time.time(), "sources": sources,
+                "tables": {}, "indexes": {}}
+    for table, frame in tables.items():
+        columns, codes_by_column = _encode(frame, table, out_dir)
+        manifest["tables"][table] = {"rows": len(frame), "columns": columns, "meta": meta.get(table, {})}
+        if table == 'main':
+            indexed = []
+            for name in INDEX_COLUMNS:
+                if name not in codes_by_column:
+                    continue
+                index = SortedIndex.from_codes(*codes_by_column[name])
+                i = list(frame.columns).index(name)
+                np.save(out_dir / f"{table}.{i}.order.npy", index.order)
+                np.save(out_dir / f"{table}.{i}.offsets.npy", index.offsets)
+                indexed.append(name)
+            manifest["indexes"][table] = indexed
+    (out_dir / MANIFEST).write_text(json.dumps(manifest, indent=2))
+
+
+def _prune(snapshot_dir, keep):
+    # Replicas still mapping an old snapshot keep reading it; unlinked files stay valid while mapped
+    for path in snapshot_dir.iterdir():
+        if path.is_dir() and path.name != keep and ".tmp-" not in path.name:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+class Snapshot:
+    """A built snapshot with its arrays memory-mapped read-only."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.manifest = json.loads((self.path / MANIFEST).read_text())
+        if self.manifest.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Snapshot {self.path} has format {self.manifest.get('version')}, expected {FORMAT_VERSION}")
+        self.key = self.manifest["key"]
+        # Everything is mapped up front, so a snapshot pruned by another process stays readable here
+        self._arrays = {f.name: np.load(f, mmap_mode='r', allow_pickle=False) for f in self.path.glob("*.npy")}
+
+    def __contains__(self, table):
+        return table in self.manifest["tables"]
+
+    def _array(self, name):
+        # np.asarray drops the memmap subclass but keeps the mapped buffer
+        return np.asarray(self._arrays[name])
+
+    def table(self, name):
+        """The table as a DataFrame; numeric columns stay backed by the mapped files."""
+        if name not in self:
+            raise FileNotFoundError(f"{SOURCES.get(name, name)} was not found when the snapshot was built")
+        data = {}
+        for i, column in enumerate(self.manifest["tables"][name]["columns"]):
+            values = self._array(f"{name}.{i}.values.npy")
+            if column["kind"] == 'array':
+                data[column["name"]] = values
+                continue
+            categorical = pd.Categorical.from_codes(self._array(f"{name}.{i}.codes.npy"), values.astype(object))
+            data[column["name"]] = categorical if column["kind"] == 'category' else np.asarray(categorical, dtype=object)
+        # copy=False keeps one block per column instead of consolidating (and copying) the mapped arrays
+        return pd.DataFrame(data, copy=False)
+
+    def indexes(self, name='main'):
+        """`SortedIndex`es over the table's lookup columns, keyed by column name."""
+        columns = [c["name"] for c in self.manifest["tables"][name]["columns"]]
+        out = {}
+        for column in self.manifest["indexes"].get(name, []):
+            i = columns.index(column)
+            out[column] = SortedIndex(self._array(f"{name}.{i}.values.npy"), self._array(f"{name}.{i}.order.npy"),
+                                      self._array(f"{name}.{i}.offsets.npy"))
+        return out
+
+    def moments(self):
+        cells = self.table('moments')
+        meta = self.manifest["tables"]["moments"]["meta"]
+        return MomentTable(cells, meta["keys"], meta["metrics"])
+
+
+def open_snapshot(data_dir=DATA_DIR, snapshot_dir=SNAPSHOT_DIR, build=True):
+    """Map the snapshot for the current data files, building it first if it is missing or stale."""
+    key, _ = snapshot_key(data_dir)
+    path = Path(snapshot_dir) / key
+    if (path / MANIFEST).exists():
+        return Snapshot(path)
+    if not build:
+        raise FileNotFoundError(f"No snapshot {key} in {snapshot_dir}")
+    return build_snapshot(data_dir, snapshot_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the dashboard's memory-mapped snapshot for the current data files.")
+    parser.add_argument("--data", default=str(DATA_DIR), help="Directory the app reads its data from.")
+    parser.add_argument("--out", default=str(SNAPSHOT_DIR), help="Snapshot directory.")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if an up-to-date snapshot exists.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    snapshot = build_snapshot(args.data, args.out) if args.force else open_snapshot(args.data, args.out)
+    tables = ", ".join(f"{name} ({t['rows']:,} rows)" for name, t in snapshot.manifest["tables"].items())
+    print(f"Snapshot {snapshot.key} ready in {time.perf_counter() - start:.2f}s: {tables}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Warm the dashboard's shared caches before a replica reports ready.
+
+After a deploy or restart, the first analyst would otherwise pay for the
+Excel load, every aggregate query and the treemap hierarchy. The warm-up
+replays the views most people open against the freshly started server: the
+default filter state (all clusters, full value range) in every analysis mode,
+plus a configurable list of popular presets in the batch reports' JSON
+format (see `export_hub.reports`). Each (preset, mode) pair is one
+browser-like session, and the sessions run concurrently on a thread pool.
+They fill the server's process-wide caches (`st.cache_data`,
+`st.cache_resource` and the `CachedBackend` aggregates), so later sessions
+with the same filters skip the work.
+
+The ready file is written only once the warm-up has finished, so a readiness
+probe such as `test -f .ready` keeps traffic away until the replica is warm.
+
+    python -m export_hub.warmup --port 8501 --presets presets.json
+    python -m export_hub.warmup --url http://localhost:8501   # warm a running server, then exit
+"""
+import argparse
+import signal
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from export_hub.data import ROOT_DIR
+from export_hub.figures import ANALYSIS_MODES
+from export_hub.loadtest import (APP_PATH, COMMODITY_LABELS, COUNTRY_LABELS, MODE_LABEL, SCENARIO_LABELS,
+                                 VALUE_LABEL, ServerSession, start_server)
+from export_hub.reports import Preset, load_presets
+
+READY_PATH = ROOT_DIR / ".ready"
+CLUSTER_LABEL = "Filter by Cluster"
+OUTLIER_LABEL = "Exclude price outliers"
+
+
+def _match(options, name):
+    # Commodity names in the data are space-padded
+    wanted = str(name).strip().upper()
+    return next((o for o in options if o.strip().upper() == wanted), None)
+
+
+def _apply(session, label, value):
+    # Widgets the current page does not show are skipped
+    if label not in session.widgets or value is None:
+        return True
+    return session.set(label, value)[1]
+
+
+def warm_view(url, preset, mode):
+    """Open `mode` with `preset`'s filters and selections in a new session; returns (seconds, ok)."""
+    session = ServerSession(url)
+    start = time.perf_counter()
+    try:
+        ok = session.start()[1]
+        widgets = session.widgets
+        if preset.clusters is not None and CLUSTER_LABEL in widgets:
+            clusters = [c for c in preset.clusters if c in widgets[CLUSTER_LABEL].options]
+            ok &= _apply(session, CLUSTER_LABEL, clusters)
+        if preset.value_range is not None and VALUE_LABEL in widgets:
+            slider = widgets[VALUE_LABEL]
+            low, high = preset.value_range
+            ok &= _apply(session, VALUE_LABEL, (max(low, slider.min), min(high, slider.max)))
+        if preset.exclude_outliers:
+            ok &= _apply(session, OUTLIER_LABEL, True)
+        ok &= _apply(session, MODE_LABEL, mode)
+
+        # Per-page selections, where the page has the widget
+        widgets = session.widgets
+        for label in COMMODITY_LABELS:
+            if preset.commodity is not None and label in widgets:
+                ok &= _apply(session, label, _match(widgets[label].options, preset.commodity))
+        for label, country in zip(COUNTRY_LABELS, preset.countries or ()):
+            if label in session.widgets:
+                ok &= _apply(session, label, _match(session.widgets[label].options, country))
+        for label, value in zip(SCENARIO_LABELS, (preset.price_increase, preset.quantity_increase)):
+            ok &= _apply(session, label, value)
+    except (ConnectionError, TimeoutError, OSError):
+        ok = False
+    finally:
+        session.close()
+    return time.perf_counter() - start, ok
+
+
+def warm_up(url, presets=(), modes=ANALYSIS_MODES, sessions=4, log=print):
+    """Warm every mode for the default filters and each preset; returns [(preset, mode, seconds, ok)]."""
+    presets = [Preset("default")] + list(presets)
+    tasks = [(preset, mode) for preset in presets for mode in modes]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions, thread_name_prefix="warmup") as pool:
+        timings = list(pool.map(lambda task: warm_view(url, *task), tasks))
+    results = [(preset.name, mode, seconds, ok) for (preset, mode), (seconds, ok) in zip(tasks, timings)]
+    failed = [r for r in results if not r[3]]
+    log(f"Warmed {len(results)} views for {len(presets)} presets in {time.perf_counter() - start:.1f}s"
+        + (f" ({len(failed)} failed)" if failed else ""))
+    for name, mode, _, _ in failed:
+        log(f"  failed: {name} / {mode}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Start the dashboard and warm its caches before reporting ready.")
+    parser.add_argument("--presets", help="JSON list of popular filter presets (same format as the batch reports).")
+    parser.add_argument("--sessions", type=int, default=4, help="Concurrent warm-up sessions.")
+    parser.add_argument("--port", type=int, default=8501, help="Port for the server this tool starts.")
+    parser.add_argument("--url", help="Warm an already running server and exit instead of starting one.")
+    parser.add_argument("--app", default=str(APP_PATH), help="Streamlit script to serve.")
+    parser.add_argument("--ready-file", default=str(READY_PATH), help="Written once the warm-up has finished.")
+    args = parser.parse_args()
+
+    ready = Path(args.ready_file)
+    ready.unlink(missing_ok=True)
+    presets = load_presets(args.presets) if args.presets else []
+
+    if args.url:
+        results = warm_up(args.url, presets, sessions=args.sessions)
+        ready.touch()
+        sys.exit(0 if all(ok for *_, ok in results) else 1)
+
+    proc, url = start_server(Path(args.app).resolve(), args.port, quiet=False)
+    # Stop the server along with this process, and stop reporting ready with it
+    signal.signal(signal.SIGTERM, lambda *_: proc.terminate())
+    try:
+        # A failed view only means a colder cache, so the replica still reports ready
+        warm_up(url, presets, sessions=args.sessions)
+        ready.touch()
+        proc.wait()
+    except KeyboardInterrupt:
+        proc.terminate()
+        proc.wait(timeout=30)
+    finally:
+        ready.unlink(missing_ok=True)
+    sys.exit(proc.returncode)
+
+
+if __name__ == "__main__":
+    main()
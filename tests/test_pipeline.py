@@ -0,0 +1,38 @@
+"""The pipeline's derived tables must be free of non-finite values."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from export_hub.pipeline import Pipeline, default_stages
+
+# Stages that derive tables for the app; raw and clean keep the source's zero quantities
+DERIVED_STAGES = ['features', 'cluster', 'commodity_summary', 'risk', 'gems', 'sankey']
+
+
+@pytest.fixture(scope="module")
+def outputs(tmp_path_factory):
+    root = tmp_path_factory.mktemp("pipeline")
+    pipeline = Pipeline(default_stages(out_dir=root / "data"), cache_dir=root / "cache")
+    return pipeline.run(log=lambda line: None)
+
+
+def _frames(output):
+    if isinstance(output, pd.DataFrame):
+        return [output]
+    if isinstance(output, dict):
+        return [v for v in output.values() if isinstance(v, pd.DataFrame)]
+    return []
+
+
+@pytest.mark.parametrize("stage", DERIVED_STAGES)
+def test_stage_output_is_finite(outputs, stage):
+    frames = _frames(outputs[stage])
+    assert frames
+    for frame in frames:
+        numeric = frame.select_dtypes('number')
+        bad = numeric.columns[~np.isfinite(numeric.to_numpy(dtype=float)).all(axis=0)]
+        assert not len(bad), f"{stage}: non-finite values in {list(bad)}"
+
+
+def test_features_are_finite(outputs):
+    assert np.isfinite(outputs['features']['scaled']).all()
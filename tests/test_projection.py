@@ -0,0 +1,74 @@
+"""Folding a new period into the stored projection."""
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.preprocessing import StandardScaler
+
+from export_hub.projection import (PCA_COLUMNS, add_projection, fit_projection, load_bundle, normalize_names,
+                                   project, reproject_store, save_bundle, update_projection)
+from export_hub.query import MAIN_FILE
+
+FEATURES = ['VALUE_USD_MILLION', 'QUANTITY_KGS', 'PRICE_PER_KG']
+COMMODITIES = ['RICE  ', 'TEA', 'SPICES ', 'STEEL']
+
+
+def _period(seed, n=2000):
+    # Mildly skewed features, so one draw is a fair sample of the next
+    rng = np.random.default_rng(seed)
+    commodity = rng.choice(COMMODITIES, n)
+    base_price = pd.Series(commodity).map({c: 2.0 ** i for i, c in enumerate(COMMODITIES)}).to_numpy()
+    quantity = np.round(10 ** rng.normal(5, 0.15, n))
+    price = base_price * 10 ** rng.normal(0, 0.1, n)
+    value = price * quantity / 1_000_000
+    return pd.DataFrame({
+        'COMMODITY_NAME': commodity,
+        'COUNTRY': rng.choice(['NEPAL', 'CHINA', 'USA'], n),
+        'QUANTITY_KGS': quantity,
+        'VALUE_USD_MILLION': value,
+        'PRICE_PER_KG': price,
+    })
+
+
+@pytest.fixture
+def store(tmp_path):
+    frame = _period(0)
+    scaler = StandardScaler()
+    scaled = scaler.fit_transform(frame[FEATURES])
+    pca = fit_projection(scaled)
+    add_projection(frame, project(pca, scaled)).to_excel(tmp_path / MAIN_FILE, index=False, engine='openpyxl')
+    bundle = {'scaler': scaler, 'pca': pca, 'features': FEATURES,
+              'commodities': sorted(set(normalize_names(frame['COMMODITY_NAME'])))}
+    save_bundle(bundle, tmp_path / "projection_model.joblib")
+    return tmp_path
+
+
+def _coords(data_dir):
+    return pd.read_excel(data_dir / MAIN_FILE, engine='openpyxl')[PCA_COLUMNS].to_numpy()
+
+
+def test_in_distribution_update_keeps_stored_coordinates(store):
+    before = _coords(store)
+    bundle = load_bundle(store / "projection_model.joblib")
+    update_projection(bundle, _period(1))
+    reproject_store(bundle, store)
+    after = _coords(store)
+    scale = before.std(axis=0)
+    assert (np.abs(after.mean(axis=0) - before.mean(axis=0)) < 0.1 * scale).all()
+    assert (np.abs(after - before).mean(axis=0) < 0.1 * scale).all()
+
+
+def test_outliers_and_unknown_commodities_are_not_folded_in(store):
+    partition = _period(1)
+    bad = pd.DataFrame({
+        'COMMODITY_NAME': ['TEA', 'TEA', 'SHIPS'],
+        'COUNTRY': 'USA',
+        'QUANTITY_KGS': [10.0, 10.0, 1.0],
+        'VALUE_USD_MILLION': [5_000.0, 0.0, 250.0],
+        'PRICE_PER_KG': [5e8, 0.0, 2.5e8],
+    })
+    clean_bundle = load_bundle(store / "projection_model.joblib")
+    noisy_bundle = load_bundle(store / "projection_model.joblib")
+    coords = update_projection(clean_bundle, partition)
+    noisy_coords = update_projection(noisy_bundle, pd.concat([partition, bad], ignore_index=True))
+    assert len(noisy_coords) == len(coords)
+    np.testing.assert_allclose(noisy_bundle['pca'].components_, clean_bundle['pca'].components_)
@@ -0,0 +1,144 @@
+"""Every query backend must return what a plain in-memory PandasBackend returns."""
+import numpy as np
+import pandas as pd
+import pandas.testing as tm
+import pytest
+
+from export_hub.query import (CachedBackend, DuckDBBackend, Filters, PandasBackend, SortedIndex, prepare_frame,
+                              write_parquet)
+from export_hub.snapshot import INDEX_COLUMNS
+
+TREEMAP_KEY = ['Cluster', 'COMMODITY_NAME', 'COUNTRY']
+
+FILTERS = [
+    Filters(),
+    Filters(clusters=()),
+    Filters(clusters=('Cluster 1',)),
+    Filters(clusters=('Cluster 0', 'Cluster 2'), value_range=(0.5, 40.0)),
+    Filters(exclude_outliers=True),
+    Filters(clusters=('Cluster 0', 'Cluster 1', 'Cluster 2'), exclude_outliers=True),
+    Filters().where(COUNTRY='NEPAL'),
+    Filters(exclude_outliers=True).where(COMMODITY_NAME='RICE', COUNTRY='CHINA'),
+    Filters(clusters=()).where(COUNTRY='NEPAL'),
+    Filters(clusters=('Cluster 1',)).where(Cluster='Cluster 1', COUNTRY='UK'),
+    Filters().where(COUNTRY='NOWHERE'),
+]
+
+
+def _fixture_frame():
+    rng = np.random.default_rng(7)
+    commodities = ['RICE', 'TEA', 'GOLD', 'STEEL']
+    countries = ['NEPAL', 'CHINA', 'USA', 'UAE', 'UK']
+    rows = [(c, k) for c in commodities for k in countries for _ in range(3)]
+    n = len(rows)
+    quantity = rng.integers(1_000, 1_000_000, n)
+    value = rng.gamma(2.0, 10.0, n).round(2)
+    frame = pd.DataFrame({
+        'COMMODITY_NAME': [c for c, _ in rows],
+        'COUNTRY': [k for _, k in rows],
+        'UNIT': 'KGS',
+        'QUANTITY_KGS': quantity,
+        'VALUE_USD_MILLION': value,
+        'PRICE_PER_KG': value * 1_000_000 / quantity,
+        'Cluster': rng.integers(0, 3, n),
+        'PCA1': rng.normal(size=n),
+        'PCA2': rng.normal(size=n),
+        'PCA3': rng.normal(size=n),
+    })
+    frame['Cluster_Label'] = 'Label ' + frame['Cluster'].astype(str)
+    # One of each flag: a zero price, a price outlier and a non-finite price
+    frame.loc[0, ['VALUE_USD_MILLION', 'PRICE_PER_KG']] = 0.0
+    frame.loc[1, 'PRICE_PER_KG'] *= 1e6
+    frame.loc[2, 'PRICE_PER_KG'] = np.inf
+    return prepare_frame(frame)
+
+
+@pytest.fixture(scope="module")
+def frame():
+    return _fixture_frame()
+
+
+def _indexed(frame):
+    # As the app serves it from the snapshot: equality filters go through SortedIndex lookups
+    return PandasBackend(frame, {c: SortedIndex.from_values(frame[c]) for c in INDEX_COLUMNS})
+
+
+@pytest.fixture(scope="module", params=["duckdb", "indexed", "cached"])
+def backends(request, frame, tmp_path_factory):
+    if request.param == "duckdb":
+        # The DuckDB backend is optional (requirements-duckdb.txt)
+        pytest.importorskip("duckdb")
+        pytest.importorskip("pyarrow")
+        path = tmp_path_factory.mktemp("parity") / "exports.parquet"
+        write_parquet(frame, path, row_group_size=16)
+        backend = DuckDBBackend(path, threads=2)
+    elif request.param == "indexed":
+        backend = _indexed(frame)
+    else:
+        backend = CachedBackend(_indexed(frame))
+    return PandasBackend(frame), backend
+
+
+def test_fixture_has_every_flag(frame):
+    assert set(frame['PRICE_FLAG']) == {'ok', 'outlier', 'non_finite', 'zero_price'}
+
+
+def test_cached_results_are_copies(frame):
+    backend = CachedBackend(_indexed(frame))
+    filters = Filters(exclude_outliers=True).where(COUNTRY='NEPAL')
+    first = backend.group_sum(filters, 'COMMODITY_NAME')
+    expected = first.copy()
+    first[:] = -1.0
+    tm.assert_series_equal(backend.group_sum(filters, 'COMMODITY_NAME'), expected)
+    summary = backend.summary(filters)
+    summary['rows'] = -1
+    assert backend.summary(filters)['rows'] == PandasBackend(frame).summary(filters)['rows']
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+@pytest.mark.parametrize("limit", [None, 5])
+def test_frame(backends, filters, limit):
+    reference, backend = backends
+    expected = reference.frame(filters, limit=limit).reset_index(drop=True)
+    tm.assert_frame_equal(backend.frame(filters, limit=limit).reset_index(drop=True), expected)
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_frame_columns(backends, filters):
+    reference, backend = backends
+    columns = ['COUNTRY', 'VALUE_USD_MILLION', 'PRICE_FLAG']
+    expected = reference.frame(filters, columns).reset_index(drop=True)
+    tm.assert_frame_equal(backend.frame(filters, columns).reset_index(drop=True), expected)
+
+
+@pytest.mark.parametrize("filters", FILTERS + [None])
+@pytest.mark.parametrize("column", ['COMMODITY_NAME', 'COUNTRY', 'Cluster'])
+def test_distinct(backends, filters, column):
+    reference, backend = backends
+    assert backend.distinct(column, filters) == reference.distinct(column, filters)
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+@pytest.mark.parametrize("by", ['COMMODITY_NAME', 'COUNTRY', ['COMMODITY_NAME', 'COUNTRY'], TREEMAP_KEY])
+def test_group_sum(backends, filters, by):
+    reference, backend = backends
+    tm.assert_series_equal(backend.group_sum(filters, by), reference.group_sum(filters, by))
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+@pytest.mark.parametrize("by", ['COMMODITY_NAME', 'COUNTRY', ['COMMODITY_NAME', 'COUNTRY']])
+@pytest.mark.parametrize("n", [1, 3, 10])
+def test_top_n(backends, filters, by, n):
+    reference, backend = backends
+    tm.assert_series_equal(backend.top_n(filters, by, n), reference.top_n(filters, by, n))
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_summary(backends, filters):
+    reference, backend = backends
+    assert backend.summary(filters) == pytest.approx(reference.summary(filters))
+
+
+def test_bounds(backends):
+    reference, backend = backends
+    assert backend.bounds('VALUE_USD_MILLION') == reference.bounds('VALUE_USD_MILLION')
@@ -0,0 +1,82 @@
+"""A snapshot must hand back exactly the tables and indexes it was built from."""
+import numpy as np
+import pandas as pd
+import pandas.testing as tm
+import pytest
+
+from export_hub.moments import MOMENTS_PATH, MomentTable
+from export_hub.query import MAIN_FILE, prepare_frame
+from export_hub.snapshot import INDEX_COLUMNS, SOURCES, build_snapshot, open_snapshot
+
+CSV_TABLES = ('market_risk', 'hidden_gems', 'sankey')
+
+
+def _main_table(n=60):
+    rng = np.random.default_rng(3)
+    quantity = rng.integers(1, 100_000, n)
+    value = rng.gamma(2.0, 5.0, n).round(2)
+    frame = pd.DataFrame({
+        'COMMODITY_NAME': rng.choice(['RICE  ', 'TEA', 'GOLD'], n),
+        'COUNTRY': rng.choice(['NEPAL', 'CHINA', 'USA', 'UK'], n),
+        'UNIT': 'KGS',
+        'QUANTITY_KGS': quantity,
+        'VALUE_USD_MILLION': value,
+        'PRICE_PER_KG': value * 1_000_000 / quantity,
+        'Cluster': rng.integers(0, 3, n),
+        'PCA1': rng.normal(size=n),
+        'PCA2': rng.normal(size=n),
+        'PCA3': rng.normal(size=n),
+    })
+    frame['Cluster_Label'] = 'Label ' + frame['Cluster'].astype(str)
+    frame.loc[0, 'VALUE_USD_MILLION'] = frame.loc[0, 'PRICE_PER_KG'] = 0.0
+    return frame
+
+
+@pytest.fixture(params=["moments file", "moments from rows"])
+def data_dir(request, tmp_path):
+    data = tmp_path / "data"
+    data.mkdir()
+    main = _main_table()
+    main.to_excel(data / MAIN_FILE, index=False, engine='openpyxl')
+    pd.DataFrame({'COMMODITY_NAME': ['RICE', 'TEA'], 'TOTAL': [1.5, 2.25]}).to_csv(data / SOURCES['market_risk'], index=False)
+    pd.DataFrame({'COMMODITY_NAME': ['GOLD'], 'PRICE': [9.0]}).to_csv(data / SOURCES['hidden_gems'], index=False)
+    pd.DataFrame({'source': ['Cluster 0'], 'target': ['RICE'], 'value': [3.0]}).to_csv(data / SOURCES['sankey'], index=False)
+    if request.param == "moments file":
+        MomentTable.from_frame(prepare_frame(main)).save(data / MOMENTS_PATH.name)
+    return data
+
+
+def test_round_trip(data_dir, tmp_path):
+    snapshot_dir = tmp_path / "snapshot"
+    built = build_snapshot(data_dir, snapshot_dir)
+    snapshot = open_snapshot(data_dir, snapshot_dir, build=False)
+    assert snapshot.key == built.key
+
+    main = prepare_frame(pd.read_excel(data_dir / MAIN_FILE, engine='openpyxl'))
+    tm.assert_frame_equal(snapshot.table('main'), main)
+    for name in CSV_TABLES:
+        tm.assert_frame_equal(snapshot.table(name), pd.read_csv(data_dir / SOURCES[name]))
+
+    indexes = snapshot.indexes('main')
+    assert sorted(indexes) == sorted(INDEX_COLUMNS)
+    for column, index in indexes.items():
+        for value in main[column].unique():
+            np.testing.assert_array_equal(np.sort(index.rows(value)), np.flatnonzero(main[column] == value))
+        assert len(index.rows('not a value')) == 0
+
+    expected = MomentTable.from_frame(main)
+    moments = snapshot.moments()
+    assert list(moments.keys) == list(expected.keys) and list(moments.metrics) == list(expected.metrics)
+    tm.assert_frame_equal(moments.cells.reset_index(drop=True), expected.cells.reset_index(drop=True))
+
+
+def test_changed_source_builds_a_new_snapshot(data_dir, tmp_path):
+    snapshot_dir = tmp_path / "snapshot"
+    old = build_snapshot(data_dir, snapshot_dir)
+    pd.DataFrame({'source': ['Cluster 1'], 'target': ['TEA'], 'value': [4.0]}).to_csv(data_dir / SOURCES['sankey'], index=False)
+    new = open_snapshot(data_dir, snapshot_dir)
+    assert new.key != old.key
+    assert new.table('sankey')['target'].tolist() == ['TEA']
+    # The old snapshot is pruned, but stays readable for a process that still has it mapped
+    assert [p.name for p in snapshot_dir.iterdir()] == [new.key]
+    assert old.table('sankey')['target'].tolist() == ['RICE']